@@ -1,62 +1,249 @@
 #!/usr/bin/env python3
+"""
+Copies every table of one database into another, for example to move Hades to a new server
 
-from flask_sqlalchemy import SQLAlchemy
-
-# Import event related classes
-from hades.models.csi import CSINovember2019, CSINovemberNonMember2019
-from hades.models.codex import CodexApril2019, RSC2019
-from hades.models.techo import EHJuly2019, P5November2019
-from hades.models.workshop import (
-    CPPWSMay2019,
-    CCPPWSAugust2019,
-    Hacktoberfest2019,
-    CNovember2019,
-    BitgritDecember2019,
+Tables are read in chunks in the order of their primary keys and written with one INSERT per chunk, so memory use
+doesn't grow with the size of the tables. Tables which don't reference each other are copied in parallel, each table
+only once the tables it references are done. The last key copied is saved in `clone_progress` in the destination
+in the same transaction as each chunk, so running the clone again after a failure carries on where it stopped. The
+progress table is dropped once every table is copied, and the sequences generating IDs are moved past the copied rows.
+
+Usage: ./clone_db.py [-j WORKERS] [--chunk-size ROWS] [--restart] [SOURCE] [DESTINATION]
+"""
+
+import json
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from time import perf_counter
+
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    create_engine,
+    func,
+    inspect,
+    select,
+    text,
+    tuple_,
 )
 
-# Import miscellaneous classes
-from hades.models.test import TestTable
-from hades.models.user import Users
-from hades.models.event import Events
-from hades.models.user_access import Access
+from hades import db
 
-from flask import Flask
+progress_metadata = MetaData()
+progress = Table(
+    'clone_progress',
+    progress_metadata,
+    Column('name', String(50), primary_key=True),
+    Column('last_key', Text),
+    Column('rows', Integer, nullable=False, default=0),
+    Column('done', Boolean, nullable=False, default=False),
+)
 
-from hades import app, db, EVENT_CLASSES
 
-# Source is taken from app
-src = input('Enter source DB URI: ')
-dest = input('Enter destination DB URI: ')
+def encode_key(row, columns: list) -> str:
+    """Returns the primary key of a row as JSON"""
+    return json.dumps(
+        [
+            (
+                row[c.name].isoformat()
+                if isinstance(row[c.name], datetime)
+                else row[c.name]
+            )
+            for c in columns
+        ]
+    )
 
-dest_app = Flask(__name__)
-dest_db = SQLAlchemy(dest_app)
-dest_app.config['SQLALCHEMY_DATABASE_URI'] = dest
 
+def decode_key(key: str, columns: list) -> list:
+    """Returns the values of a primary key saved with `encode_key`"""
+    return [
+        datetime.fromisoformat(v) if isinstance(c.type, DateTime) else v
+        for c, v in zip(columns, json.loads(key))
+    ]
 
-app.config['SQLALCHEMY_DATABASE_URI'] = src
-print('Source tables: ')
-print(db.engine.table_names())
-print('Running create_all() on destination URI')
-app.config['SQLALCHEMY_DATABASE_URI'] = dest
-db.create_all()
-print(db.engine.table_names())
-app.config['SQLALCHEMY_DATABASE_URI'] = src
 
+def copy_table(table: Table, source, destination, chunk_size: int) -> (int, float):
+    """
+    Function to copy a table, carrying on from its saved progress
+    :param table: The table
+    :param source: Engine of the source database
+    :param destination: Engine of the destination database
+    :param chunk_size: Number of rows copied per transaction
+    :return: Number of rows copied by this run, and the seconds it took
+    """
+    with destination.connect() as conn:
+        saved = conn.execute(
+            select([progress]).where(progress.c.name == table.name)
+        ).first()
+    if saved is not None and saved.done:
+        return 0, 0
+    if saved is None:
+        with destination.begin() as conn:
+            conn.execute(progress.insert().values(name=table.name, rows=0, done=False))
 
-tables = db.engine.table_names()
-tables.reverse()
-for table in tables:
-    print(f'Checking entries in {table}')
-    table = EVENT_CLASSES[table]
-    if table is None:
-        print('Table is None')
-        continue
-    data = db.session.query(table).all()
-    for i in data:
-        user_data = table()
-        for k, v in i.__dict__.items():
-            if k == '_sa_instance_state':
+    key = list(table.primary_key.columns)
+    last_key = None
+    if saved is not None and saved.last_key is not None:
+        last_key = decode_key(saved.last_key, key)
+
+    start = perf_counter()
+    copied = 0
+    with source.connect() as conn:
+        # Each chunk is a query for the keys after the last one copied, as mysql-connector ignores `stream_results`
+        # and would read the whole table into memory
+        while True:
+            query = select([table]).order_by(*key).limit(chunk_size)
+            if last_key is not None:
+                query = query.where(tuple_(*key) > tuple_(*last_key))
+            rows = conn.execute(query).fetchall()
+            if not rows:
+                break
+            with destination.begin() as dest:
+                dest.execute(table.insert(), [dict(row) for row in rows])
+                dest.execute(
+                    progress.update()
+                    .where(progress.c.name == table.name)
+                    .values(
+                        last_key=encode_key(rows[-1], key),
+                        rows=progress.c.rows + len(rows),
+                    )
+                )
+            copied += len(rows)
+            last_key = [rows[-1][c.name] for c in key]
+
+    with destination.begin() as conn:
+        conn.execute(
+            progress.update().where(progress.c.name == table.name).values(done=True)
+        )
+    return copied, perf_counter() - start
+
+
+def reset_sequence(table: Table, destination):
+    """
+    Function to move the counter generating the IDs of a table past the largest ID copied, since copying the rows
+    with their IDs doesn't advance it, and the next insert would otherwise get an ID which is already taken
+
+    SQLite picks the next ID from the rows themselves, so only PostgreSQL and MySQL need this
+    :param table: The table, which is skipped unless its primary key is a single auto-incrementing integer column
+    :param destination: Engine of the destination database
+    """
+    dialect = destination.dialect.name
+    key = list(table.primary_key.columns)
+    if (
+        dialect not in ('postgresql', 'mysql')
+        or len(key) != 1
+        or not isinstance(key[0].type, Integer)
+        or key[0].autoincrement not in (True, 'auto')
+    ):
+        return
+    with destination.begin() as conn:
+        next_id = (conn.execute(select([func.max(key[0])])).scalar() or 0) + 1
+        if dialect == 'postgresql':
+            conn.execute(
+                text(
+                    'SELECT setval(pg_get_serial_sequence(:table, :column), :id, false)'
+                ),
+                table=table.name,
+                column=key[0].name,
+                id=next_id,
+            )
+        else:
+            # ALTER TABLE doesn't take bound parameters, the value is an integer read from the database
+            conn.execute(
+                f'ALTER TABLE {destination.dialect.identifier_preparer.quote(table.name)} '
+                f'AUTO_INCREMENT = {int(next_id)}'
+            )
+
+
+def get_levels(tables: list) -> list:
+    """
+    Function to group tables so that every table comes after the tables it references
+    :param tables: The tables, sorted by their dependencies
+    :return: List of lists of tables, where the tables in each list can be copied at the same time
+    """
+    levels = {}
+    for table in tables:
+        levels[table] = 1 + max(
+            (
+                levels[key.column.table]
+                for key in table.foreign_keys
+                if key.column.table in levels
+            ),
+            default=-1,
+        )
+    grouped = [[] for _ in range(max(levels.values(), default=-1) + 1)]
+    for table, level in levels.items():
+        grouped[level].append(table)
+    return grouped
+
+
+parser = ArgumentParser(description='Copy every table of one database into another')
+parser.add_argument('source', nargs='?', help='URI of the source database')
+parser.add_argument('destination', nargs='?', help='URI of the destination database')
+parser.add_argument(
+    '-j', '--workers', type=int, default=4, help='tables copied at the same time'
+)
+parser.add_argument(
+    '--chunk-size', type=int, default=5000, help='rows copied per transaction'
+)
+parser.add_argument(
+    '--restart',
+    action='store_true',
+    help='forget the saved progress, for an emptied destination',
+)
+args = parser.parse_args()
+
+source = create_engine(args.source or input('Enter source DB URI: '))
+destination = create_engine(args.destination or input('Enter destination DB URI: '))
+workers = args.workers
+if destination.dialect.name == 'sqlite' and workers > 1:
+    # SQLite allows a single writer, parallel copies would only wait on each other
+    print('Copying one table at a time into SQLite')
+    workers = 1
+
+existing = set(inspect(source).get_table_names())
+print(f'Source tables: {sorted(existing)}')
+print('Creating the tables on the destination')
+db.metadata.create_all(destination)
+if args.restart:
+    progress_metadata.drop_all(destination)
+progress_metadata.create_all(destination)
+
+tables = [t for t in db.metadata.sorted_tables if t.name in existing]
+start = perf_counter()
+total = 0
+with ThreadPoolExecutor(workers) as executor:
+    for level in get_levels(tables):
+        futures = {
+            table: executor.submit(
+                copy_table, table, source, destination, args.chunk_size
+            )
+            for table in level
+        }
+        for table, future in futures.items():
+            copied, seconds = future.result()
+            if not seconds:
+                print(f'Skipped {table.name}, which was already copied')
                 continue
-            setattr(user_data, k, v)
-        dest_db.session.add(user_data)
-    dest_db.session.commit()
+            total += copied
+            print(
+                f'Copied {copied} rows of {table.name} in {seconds:.2f} seconds, '
+                f'{copied / seconds:.0f} rows per second'
+            )
+
+print('Moving the ID sequences past the copied rows')
+for table in tables:
+    reset_sequence(table, destination)
+
+progress_metadata.drop_all(destination)
+elapsed = perf_counter() - start
+print(
+    f'Copied {total} rows in {elapsed:.2f} seconds, {total / elapsed:.0f} rows per second'
+)
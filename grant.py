@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Grants users access to tables, without prompting, so that it can be run from scripts
+
+Users and tables are given as arguments, or read from files with one name per line (`-` for stdin), and all grants are
+inserted in one transaction, skipping the ones which already exist.
+
+Usage: ./grant.py -u alice bob -t codex_december_2019 bov_2020
+       ./grant.py -U users.txt --all-tables
+"""
+
+from argparse import ArgumentParser
+from sys import exit, stdin
+
+from hades import db
+from hades.db_utils import insert_ignore
+from hades.models.event import Events
+from hades.models.user import Users
+from hades.models.user_access import Access
+
+
+def read_names(path: str) -> list:
+    """Returns the names in a file, one per line, ignoring empty lines and comments starting with #"""
+    lines = stdin if path == '-' else open(path)
+    with lines:
+        return [
+            line.split('#')[0].strip() for line in lines if line.split('#')[0].strip()
+        ]
+
+
+parser = ArgumentParser(description='Grant users access to tables')
+parser.add_argument('-u', '--users', nargs='+', default=[], help='usernames')
+parser.add_argument('-U', '--users-file', help='file with one username per line')
+parser.add_argument('-t', '--tables', nargs='+', default=[], help='table names')
+parser.add_argument('-T', '--tables-file', help='file with one table name per line')
+parser.add_argument(
+    '--all-tables', action='store_true', help='grant access to every table'
+)
+parser.add_argument(
+    '-n', '--dry-run', action='store_true', help='only print the grants to be made'
+)
+args = parser.parse_args()
+
+usernames = set(args.users)
+if args.users_file:
+    usernames.update(read_names(args.users_file))
+table_names = set(args.tables)
+if args.tables_file:
+    table_names.update(read_names(args.tables_file))
+if not usernames or not (table_names or args.all_tables):
+    parser.error('Please provide users and tables')
+
+# Users and tables are each resolved with one query
+found = {
+    username
+    for (username,) in db.session.query(Users.username).filter(
+        Users.username.in_(usernames)
+    )
+}
+if usernames - found:
+    print(f'Users {", ".join(sorted(usernames - found))} do not seem to exist!')
+    exit(1)
+events = db.session.query(Events.name)
+if not args.all_tables:
+    events = events.filter(Events.name.in_(table_names))
+events = {name for (name,) in events}
+if table_names - events:
+    print(
+        f'Tables {", ".join(sorted(table_names - events))} do not seem to exist, please run `db_setup.py`!'
+    )
+    exit(1)
+
+existing = set(
+    db.session.query(Access.user, Access.event)
+    .filter(Access.user.in_(usernames))
+    .filter(Access.event.in_(events))
+)
+grants = [
+    {'user': username, 'event': event}
+    for username in sorted(usernames)
+    for event in sorted(events)
+    if (username, event) not in existing
+]
+for grant in grants:
+    print(f'Granting access on {grant["event"]} to {grant["user"]}')
+if args.dry_run or not grants:
+    print(f'{len(grants)} grants to be made, {len(existing)} already exist')
+    exit(0)
+
+insert_ignore(Access.__table__, grants)
+db.session.commit()
+print(f'Made {len(grants)} grants, {len(existing)} already existed')
@@ -6,6 +6,7 @@ Flask application to accept some details, generate, display, and email a QR code
 # pylint: disable=invalid-name,too-few-public-methods,no-member,line-too-long,too-many-locals
 
 from datetime import datetime
+from io import BytesIO
 from urllib.parse import urlparse, urljoin
 
 from decouple import config
@@ -33,7 +34,11 @@ from .db_utils import *
 
 from .utils import *
 
-from . import api
+from . import admission, api, compression, exports, search, stream
+from .cache import cached, users_cache
+
+from .pipeline import REQUIRED_FIELDS, load_plans
+from .stream import publish
 
 # Import event related classes
 
@@ -41,12 +46,11 @@ from . import api
 from .models.user import Users, TSG
 from .models.user_access import Access
 
-# A list of currently active events
-ACTIVE_TABLES = [models.giveaway.Coursera2020]
-ACTIVE_EVENTS = ['Coursera 2020']
+# Submission plans of the currently active events, compiled from the events file
+PLANS = load_plans()
 
-# The list of fields that will be required for any and all form submissions
-REQUIRED_FIELDS = ('name', 'phone', 'email')
+# Email address used to send mails
+FROM_EMAIL = config('FROM_EMAIL', default='noreply@thescriptgroup.in')
 
 
 def is_safe_url(target: str) -> bool:
@@ -116,31 +120,24 @@ def unauthorized():
 def submit():
     """Accepts form data for an event registration
 
-    Some required fields are
-    db -> The name of the database corresponding to the event. This will be hardcoded as an invisible uneditable field
-    event -> The name of the event
+    Everything about how an event accepts registrations comes from its entry in the events file, compiled into a
+    `SubmitPlan` at startup (see `hades.pipeline`)
 
-    These fields can be skipped if ACTIVE_TABLES and ACTIVE_EVENTS lists have only one element
+    db -> The name of the database corresponding to the event. This will be hardcoded as an invisible uneditable field
+    It can be skipped if there is only one active event
     This is done as we usually don't have more than 1 event at one time, we can reduce the risk of data being changed
     at the frontend by directly setting it here in the backend
 
-    The rest of the parameters vary per event, we check the keys in the form items against the attributes of the
-    corresponding event class to ensure that no extraneous data is accepted
+    The rest of the parameters vary per event, only the ones which are columns of the corresponding event class are
+    accepted, to ensure that no extraneous data is stored
 
     Some required ones are
     -> name - Person's name
     -> email - Person's email address
-    -> department - Person's department
+    -> phone - Person's phone number
 
     Some optional fields which are *NOT* members of any class
-    -> no_qr - To disable QR generation and attachment in email
     -> whatsapp_number - To store WhatsApp number separately
-    -> chat_id - Alternative Telegram Chat ID where registrations should be logged
-    -> email_content - Alternative email content to be sent to user
-    -> email_formattable_content - content where some field needs to be replaced with the fields in email_content_fields
-    -> email_content_fields - list of additional form fields which need to be replaced with variable's value in the email_formattable_content
-    -> extra_message - Extra information to be appended to end of email
-    -> extra_field_telegram - If anything besides ID and name are to be logged to Telegram, it is specified here
 
     The next three are specifically for events with group registrations
     -> name_second_person
@@ -152,13 +149,13 @@ def submit():
     Based on the data, a QR code is generated, displayed, and also emailed to the user(s).
     """
 
-    # If there's just one active table, no need of checking
-    if len(ACTIVE_TABLES) == 1:
-        table = ACTIVE_TABLES[0]
+    # If there's just one active event, no need of checking
+    if len(PLANS) == 1:
+        plan = next(iter(PLANS.values()))
     elif 'db' in request.form:
-        table = get_table_by_name(request.form['db'])
+        plan = PLANS.get(request.form['db'])
         # Ensure that the provided table is active
-        if table not in ACTIVE_TABLES:
+        if plan is None:
             log(
                 f"Someone just tried to register to table <code>{request.form['db']}</code>"
             )
@@ -170,31 +167,16 @@ def submit():
     else:
         return "You need to specify a database!"
 
-    # If we have only one active event - we know the event name already
-    if len(ACTIVE_EVENTS) == 1:
-        event_name = ACTIVE_EVENTS[0]
-    elif 'event' in request.form:
-        event_name = request.form['event']
-    else:
-        return 'Hades does require the event name, you know?'
-
     # Ensure that we have the required fields
     for field in REQUIRED_FIELDS:
         if field not in request.form:
             return f'<code>{field}</code> is required but has not been submitted!'
 
     # ID is from a helper function that increments the latest ID by 1 and returns it
-    id_ = get_current_id(table)
-
-    data = {}
-
-    # Ensure that we only take in valid fields to create our user object
-    for k, v in request.form.items():
-        if k in table.__table__.columns._data.keys():
-            data[k] = v
+    id_ = get_current_id(plan.table)
 
     # Instantiate our user object based on the received form data and retrived ID
-    user = table(**data, id=id_)
+    user = plan.build_user(request.form, id_)
 
     # If a separate WhatsApp number has been provided, store that in the database as well
     if 'whatsapp_number' in request.form:
@@ -220,75 +202,49 @@ def submit():
         user.department += f", {request.form['department_second_person']}"
 
     # Ensure that no data is duplicated. If anything is wrong, display the corresponding error to the user
-    data = user.validate()
+    data = plan.validate(user)
     if data is not True:
         return data
 
-    # Generate the QRCode based on the given data and store base64 encoded version of it to email
-    if 'no_qr' not in request.form:
-        img = generate_qr(user)
-        img.save('qr.png')
-        img_data = open('qr.png', 'rb').read()
+    # Generate the QRCode based on the given data and store base64 encoded version of it to email. This is done before
+    # claiming a seat, which locks the event's counter until the insert below is committed
+    if plan.qr:
+        img_data = BytesIO()
+        generate_qr(user, plan.qr_blacklist).save(img_data, 'PNG')
+        img_data = img_data.getvalue()
         encoded = base64.b64encode(img_data).decode()
 
+    # Claim a seat if the event has limited capacity, this is committed or rolled back along with the insert below
+    waitlist_position = claim_seat(plan.table, user_id=user.id)
+    if waitlist_position is None:
+        db.session.rollback()
+        return 'Sorry, all the seats for this event have been filled!'
+
+    # Waitlisted registrants don't get a QR code, as it would not let them in
+    send_qr = plan.qr and not waitlist_position
+
     # Add the user to the database and commit the transaction, ensuring no integrity errors.
-    success, reason = insert(user)
+    success, reason = insert([user])
     if not success:
         log(f'Could not insert user {user}')
         log(reason)
         return """It appears there was an error while trying to enter your data into our database.<br/>Kindly contact someone from the team and we will have this resolved ASAP"""
+    publish(plan.table.__tablename__, 1)
 
     # Prepare the email sending
-    from_email = config('FROM_EMAIL', default='noreply@thescriptgroup.in')
-    to_emails = []
-    email_1 = (request.form['email'], request.form['name'])
-    to_emails.append(email_1)
+    to_emails = [(request.form['email'], request.form['name'])]
     if (
         'email_second_person' in request.form
         and 'name_second_person' in request.form
         and request.form['email'] != request.form['email_second_person']
     ):
-        email_2 = (
-            request.form['email_second_person'],
-            request.form['name_second_person'],
+        to_emails.append(
+            (request.form['email_second_person'], request.form['name_second_person'])
         )
-        to_emails.append(email_2)
-
-    # Check if the form specified the date, otherwise use the current month and year
-    if 'date' in request.form:
-        date = request.form['date']
-    else:
-        date = datetime.now().strftime('%B,%Y')
-    subject = 'Registration for {} - {} - ID {}'.format(event_name, date, id_)
-    message = """<img src='https://drive.google.com/uc?id=12VCUzNvU53f_mR7Hbumrc6N66rCQO5r-&export=download' style='width:30%;height:50%'>
-<hr>
-{}, your registration is done!
-<br/>
-""".format(
-        user.name
-    )
-    if 'no_qr' not in request.form:
-        message += """A QR code has been attached below!
-<br/>
-You're <b>required</b> to present this on the day of the event."""
-    if (
-        'email_formattable_content' in request.form
-        and 'email_content_fields' in request.form
-    ):
-        d = {}
-        for f in request.form['email_content_fields'].split(','):
-            d[f] = request.form[f]
-        message = ''
-        if 'email_content' in request.form:
-            message += request.form['email_content']
-        message += request.form['email_formattable_content'].format(**d)
-
-    if 'extra_message' in request.form:
-        message += '<br/>' + request.form['extra_message']
 
     # Take care of attachments, if any
     attachments = []
-    if 'no_qr' not in request.form:
+    if send_qr:
         attachments.append(
             {
                 'data': encoded,
@@ -298,25 +254,27 @@ You're <b>required</b> to present this on the day of the event."""
         )
 
     # Send the mail
-    mail_sent = send_mail(from_email, to_emails, subject, message, attachments)
+    mail_sent = send_mail(
+        FROM_EMAIL,
+        to_emails,
+        plan.render_subject(user),
+        plan.render_email(user, send_qr, waitlist_position),
+        attachments,
+    )
 
     # Log the new entry to desired telegram channel
-    chat_id = (
-        request.form['chat_id'] if 'chat_id' in request.form else config('GROUP_ID')
-    )
-    caption = f'Name: {user.name} | ID: {user.id}'
-    if 'extra_field_telegram' in request.form:
-        caption += f" | {request.form['extra_field_telegram']} - {request.form[request.form['extra_field_telegram']]}"
-
-    tg.send_chat_action(chat_id, 'typing')
-    tg.send_message(chat_id, f'New registration for {event_name}!')
-    if 'no_qr' not in request.form:
-        tg.send_document(chat_id, caption, 'qr.png')
+    caption = plan.render_caption(user, waitlist_position)
+    tg.send_chat_action(plan.chat_id, 'typing')
+    tg.send_message(plan.chat_id, f'New registration for {plan.event}!')
+    if send_qr:
+        tg.send_document(plan.chat_id, caption, 'qr.png', img_data)
     else:
-        tg.send_message(chat_id, caption)
+        tg.send_message(plan.chat_id, caption)
 
     ret = f'Thank you for registering, {user.name}!'
-    if 'no_qr' not in request.form:
+    if waitlist_position:
+        ret += f"<br>The event is full right now, you're number {waitlist_position} on the waitlist."
+    if send_qr:
         ret += "<br>Please save this QR Code. "
         if mail_sent:
             ret += "It has also been emailed to you."
@@ -416,12 +374,73 @@ def register():
     return render_template('register.html')
 
 
+# Number of registrations shown per page on the /events page, by default and at most
+EVENTS_PAGE_SIZE = 100
+MAX_EVENTS_PAGE_SIZE = 500
+
+
+def get_events_page(table: Model, args: dict) -> dict:
+    """
+    Function to get one page of the registrations in a table, as shown on the /events page
+    :param table: The table
+    :param args: The request's parameters, `page`, `per_page`, `sort`, `order` and `q`, all of them optional
+    :return: Dictionary with the `users` in the page, the `total` number of users found and the parameters used
+    """
+    table_name = table.__tablename__
+    columns = get_column_names(table)
+    page = max(int(args.get('page', 1)), 1)
+    per_page = min(
+        max(int(args.get('per_page', EVENTS_PAGE_SIZE)), 1), MAX_EVENTS_PAGE_SIZE
+    )
+    sortable = get_sortable_columns(table)
+    sort = args.get('sort') if args.get('sort') in sortable else sortable[0]
+    descending = args.get('order') == 'desc'
+    q = args.get('q', '').strip()
+    search = None
+    if q:
+        search = (q, [c for c in SEARCH_COLUMNS if c in columns])
+
+    def compute():
+        return {
+            'users': [
+                dict(zip(columns, row))
+                for row in select_rows(
+                    table,
+                    columns,
+                    limit=per_page,
+                    offset=(page - 1) * per_page,
+                    sort=sort,
+                    descending=descending,
+                    search=search,
+                )
+            ],
+            'total': count_rows(table, search=search),
+        }
+
+    ret = cached(
+        users_cache,
+        [table_name],
+        ('page', table_name, page, per_page, sort, descending, q),
+        compute,
+    )
+    return {
+        **ret,
+        'page': page,
+        'pages': max((ret['total'] + per_page - 1) // per_page, 1),
+        'per_page': per_page,
+        'sort': sort,
+        'order': 'desc' if descending else 'asc',
+        'q': q,
+    }
+
+
 @app.route('/events', methods=['GET', 'POST'])
 @login_required
 def events():
     """
     Displays a page with a dropdown to choose events on a GET request
-    For POST, it checks the `table` provided and accordingly returns a table listing the users in that table
+    For POST, it checks the `table` provided and accordingly returns a table listing the users in that table, one
+    page at a time
     """
     if request.method == 'POST':
         if 'table' not in request.form:
@@ -430,18 +449,55 @@ def events():
             )
         table_name = request.form['table']
         table = get_table_by_name(table_name)
-        if table is None:
-            return jsonify({'response': f'Table {table} does not seem to exist!'}, 400)
+        if table is None or table_name in INTERNAL_TABLES:
+            return (
+                jsonify({'response': f'Table {table_name} does not seem to exist!'}),
+                400,
+            )
+        if not check_access(table_name):
+            return jsonify({'response': 'Unauthorized'}), 401
         log(
             f"User <code>{current_user.name}</code> is accessing <code>{request.form['table']}</code>!"
         )
-        user_data = get_data_from_table(table)
         return render_template(
-            'users.html', users=user_data, columns=table.__table__.columns._data.keys()
+            'users.html',
+            table=table_name,
+            columns=get_column_names(table),
+            sortable=get_sortable_columns(table),
+            **get_events_page(table, {}),
         )
     return render_template('events.html', events=get_accessible_tables())
 
 
+@app.route('/events/rows')
+@login_required
+def events_rows():
+    """
+    Returns a page of the table on the /events page, as the HTML of its rows along with the number of pages
+
+    -> table - The name of the table
+    -> page - Optional page number, starting from 1
+    -> per_page - Optional number of users per page
+    -> sort - Optional column to sort by, one of those with an index
+    -> order - Optional, `asc` or `desc`
+    -> q - Optional text which the name, email, phone or PRN of the users must start with
+    """
+    table_name = request.args.get('table')
+    table = get_table_by_name(table_name) if table_name else None
+    if table is None or table_name in INTERNAL_TABLES:
+        return jsonify({'message': f'Table {table_name} does not exist!'}), 400
+    if not check_access(table_name):
+        return jsonify({'message': 'Unauthorized'}), 401
+    try:
+        page = get_events_page(table, request.args)
+    except ValueError:
+        return jsonify({'message': 'page and per_page must be numbers'}), 400
+    html = render_template(
+        'users_rows.html', columns=get_column_names(table), users=page.pop('users')
+    )
+    return jsonify({'html': html, **page}), 200
+
+
 @app.route('/update', methods=['GET', 'POST'])
 @login_required
 def update():
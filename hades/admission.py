@@ -0,0 +1,245 @@
+"""
+Admission control for incoming requests
+
+Every request belongs to a route class (`submit`, `stream`, `api` or `web`). Each class has
+-> a concurrency budget - the number of requests of that class that may run at once across all workers
+-> a bounded wait queue - requests which find the budget used up wait here, until a timeout
+-> a per-IP token bucket - limiting how fast a single client may send requests of that class
+
+Requests that find both the budget and the queue full, or time out in the queue, get a 503 with `Retry-After`.
+Requests from a client that has exhausted its token bucket get a 429 with `Retry-After`.
+
+Slots are `flock`ed files in the shared state directory, so the budget holds across the gunicorn workers and a
+slot is freed by the kernel even if a worker dies while holding it. Token buckets live in a shared SQLite database.
+"""
+
+import fcntl
+import os
+import time
+from random import random
+from typing import Union
+
+from decouple import config
+from flask import jsonify, request
+
+from . import app
+from .shared import connect, get_path, incr, incr_and_get, set_max
+
+# Whether admission control is enabled at all
+ADMISSION_CONTROL = config('ADMISSION_CONTROL', default=True, cast=bool)
+
+# Seconds that a rejected client is asked to wait before retrying
+RETRY_AFTER = config('ADMISSION_RETRY_AFTER', default=5, cast=int)
+
+BUCKETS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS buckets (
+    key TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+'''
+
+
+class RouteClass:
+    """
+    Class to hold the admission limits for one class of routes
+
+    All of them can be overridden with environment variables, for example `ADMISSION_SUBMIT_CONCURRENCY`
+
+    -> concurrency: Number of requests which may be running at once
+    -> queue: Number of requests which may be waiting for a slot
+    -> timeout: Seconds a request may wait in the queue
+    -> rate: Tokens added to a client's bucket every second, 0 to disable rate limiting
+    -> burst: Size of a client's bucket
+    """
+
+    def __init__(self, name, concurrency, queue, timeout, rate, burst):
+        prefix = f'ADMISSION_{name.upper()}'
+        self.name = name
+        self.concurrency = config(
+            f'{prefix}_CONCURRENCY', default=concurrency, cast=int
+        )
+        self.queue = config(f'{prefix}_QUEUE', default=queue, cast=int)
+        self.timeout = config(f'{prefix}_TIMEOUT', default=timeout, cast=float)
+        self.rate = config(f'{prefix}_RATE', default=rate, cast=float)
+        self.burst = config(f'{prefix}_BURST', default=burst, cast=float)
+
+
+# gunicorn runs 8 workers, so submissions together with their queue must leave some for the other classes.
+# Registrants are anonymous, so submissions can only be told apart by IP, and a whole college network or venue Wi-Fi
+# can share one. The bucket is sized for a room registering at once (a form every half second, 30 in a burst) rather
+# than for one person, and only stops a single client from flooding the form
+ROUTE_CLASSES = {
+    'submit': RouteClass('submit', concurrency=4, queue=2, timeout=5, rate=2, burst=30),
+    'api': RouteClass('api', concurrency=4, queue=4, timeout=5, rate=5, burst=20),
+    'web': RouteClass('web', concurrency=4, queue=4, timeout=5, rate=5, burst=20),
+    # Streams stay open for as long as the client is connected, so they don't queue. Each worker also serves at most
+    # `STREAMS_PER_WORKER` of them (see stream.py), 2 of its 4 threads for each of the 8 workers
+    'stream': RouteClass(
+        'stream', concurrency=16, queue=0, timeout=0, rate=0.2, burst=5
+    ),
+}
+
+
+def get_route_class(path: str) -> RouteClass:
+    """Returns the route class a request path belongs to"""
+    if path == '/submit':
+        return ROUTE_CLASSES['submit']
+    if path == '/api/stats/stream':
+        return ROUTE_CLASSES['stream']
+    if path.startswith('/api/'):
+        return ROUTE_CLASSES['api']
+    return ROUTE_CLASSES['web']
+
+
+def get_client_ip() -> str:
+    """Returns the IP address of the client, as forwarded by nginx"""
+    return request.headers.get('X-Real-IP', request.remote_addr)
+
+
+def _try_lock(kind: str, route_class: RouteClass, count: int) -> Union[int, None]:
+    """
+    Function to try to grab one of `count` slot files without blocking
+    :param kind: `slot` or `queue`
+    :param route_class: The route class the slots belong to
+    :param count: Number of slots of this kind
+    :return: File descriptor holding the lock, None if all slots are taken
+    """
+    for i in range(count):
+        fd = os.open(
+            get_path(f'admission.{route_class.name}.{kind}.{i}'),
+            os.O_CREAT | os.O_RDWR,
+        )
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            continue
+        return fd
+    return None
+
+
+def acquire_slot(route_class: RouteClass) -> Union[int, None]:
+    """
+    Function to acquire a slot in the concurrency budget of a route class, waiting in the queue if required
+    :param route_class: The route class of the current request
+    :return: File descriptor holding the slot, None if the request should be rejected
+    """
+    fd = _try_lock('slot', route_class, route_class.concurrency)
+    if fd is not None:
+        return fd
+
+    queue_fd = _try_lock('queue', route_class, route_class.queue)
+    if queue_fd is None:
+        return None
+
+    prefix = f'admission.{route_class.name}'
+    incr(f'{prefix}.queued')
+    # Counted rather than probed by locking the queue slots, which would briefly take free slots from other requests.
+    # A worker killed while waiting never decrements the count, so it is capped at the size of the queue
+    depth = incr_and_get(f'{prefix}.waiting')
+    set_max(f'{prefix}.queue_depth_max', min(depth, route_class.queue))
+
+    start = time.monotonic()
+    deadline = start + route_class.timeout
+    delay = 0.01
+    try:
+        while time.monotonic() < deadline:
+            # Randomise the sleep a little so that waiting workers don't poll in lockstep
+            time.sleep(delay * (0.5 + random()))
+            delay = min(delay * 2, 0.2)
+            fd = _try_lock('slot', route_class, route_class.concurrency)
+            if fd is not None:
+                break
+    finally:
+        os.close(queue_fd)
+        incr(f'{prefix}.waiting', -1)
+    incr(f'{prefix}.queue_wait_seconds', time.monotonic() - start)
+    return fd
+
+
+def take_token(route_class: RouteClass, client: str) -> float:
+    """
+    Function to take a token from the bucket of a client
+    :param route_class: The route class of the current request
+    :param client: IP address of the client
+    :return: 0 if a token was available, else the number of seconds until one will be
+    """
+    if route_class.rate <= 0:
+        return 0
+    key = f'{route_class.name}|{client}'
+    now = time.time()
+    conn = connect(BUCKETS_SCHEMA)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute(
+            'SELECT tokens, updated FROM buckets WHERE key = ?', (key,)
+        ).fetchone()
+        tokens = route_class.burst
+        if row is not None:
+            tokens = min(route_class.burst, row[0] + (now - row[1]) * route_class.rate)
+        wait = 0 if tokens >= 1 else (1 - tokens) / route_class.rate
+        if not wait:
+            tokens -= 1
+        conn.execute(
+            'INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)',
+            (key, tokens, now),
+        )
+        # Every now and then, forget about clients whose buckets have long been full again
+        if random() < 0.01:
+            conn.execute(
+                'DELETE FROM buckets WHERE updated < ?',
+                (now - 3600,),
+            )
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return wait
+
+
+def reject(status: int, message: str, retry_after: float):
+    """Builds the response sent to a request that was not admitted"""
+    if request.path.startswith('/api/'):
+        response = jsonify({'message': message})
+    else:
+        response = app.make_response(message)
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, int(retry_after + 0.999)))
+    return response
+
+
+@app.before_request
+def admit():
+    """Admits the current request, or rejects it if its route class is saturated"""
+    if not ADMISSION_CONTROL or request.endpoint in (None, 'static'):
+        return None
+
+    route_class = get_route_class(request.path)
+    prefix = f'admission.{route_class.name}'
+
+    wait = take_token(route_class, get_client_ip())
+    if wait:
+        incr(f'{prefix}.rate_limited')
+        return reject(429, 'Too many requests, please slow down!', wait)
+
+    fd = acquire_slot(route_class)
+    if fd is None:
+        incr(f'{prefix}.rejected')
+        return reject(
+            503,
+            'We are receiving a lot of requests right now, please try again in a bit!',
+            RETRY_AFTER,
+        )
+    incr(f'{prefix}.admitted')
+    # Kept in the environ rather than `g`, which requests run within another (see `/api/batch`) share
+    request.environ['hades.admission_slot'] = fd
+    return None
+
+
+@app.teardown_request
+def release_slot(exc):
+    """Gives the slot held by the current request back to its route class"""
+    fd = request.environ.pop('hades.admission_slot', None)
+    if fd is not None:
+        os.close(fd)
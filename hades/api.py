@@ -1,24 +1,87 @@
+import csv
+import io
+import os
+from collections import Counter
+from datetime import datetime
 from json import dumps, loads
 
 from decouple import config
-from flask import jsonify, request
+from flask import Response, g, jsonify, request, stream_with_context
 from flask_login import login_required, current_user
+from sqlalchemy import and_, func, select
 from sqlalchemy.exc import IntegrityError
+from werkzeug.exceptions import HTTPException
 
 from . import (
     app,
+    db,
     log,
 )
-from .db_utils import insert
+from .cache import backend, cached, stats_cache, users_cache
+from .db_utils import (
+    ROLLUP_GRANULARITIES,
+    build_select,
+    chunks,
+    claim_seat,
+    CHUNK_SIZE,
+    delete_rows,
+    insert,
+    insert_rows,
+    update_rows,
+    select_rows,
+    stream_rows,
+)
+from .http_cache import conditional
+from .models.change import Change
+from .models.change_purge import ChangePurge
+from .models.rollup import Rollup
+from .models.waitlist import Waitlist
 from .utils import (
+    INTERNAL_TABLES,
     check_access,
     delete_user,
-    users_to_json,
+    find_invalid_rows,
+    get_current_id,
     send_mail,
     get_table_full_name,
     get_accessible_tables,
+    get_column_names,
+    get_contacts,
+    get_registration_counts,
     get_table_by_name,
+    log_promotions,
+    rows_to_json,
 )
+from .serialize import encode, json_response, table_to_json
+from .shared import get_metrics
+from .stream import publish
+
+# Default and maximum number of users in a page of /api/users
+PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+# Maximum number of changes read by /api/users/changes at a time
+CHANGES_PAGE_SIZE = 1000
+
+# Maximum number of users in an import
+MAX_IMPORT_SIZE = 50000
+
+# Maximum number of users changed by one bulk update
+MAX_UPDATE_SIZE = 50000
+
+# Maximum number of requests in a batch
+MAX_BATCH_SIZE = 20
+
+# Endpoints which stream or download their responses, and so can't be part of a batch
+UNBATCHABLE_ENDPOINTS = ('batch_api', 'download_export', 'stats_stream')
+
+
+def requested_tables():
+    """Returns the table given in the request's `table` parameter, or None for all tables"""
+    table_name = request.args.get('table')
+    if table_name in (None, 'all'):
+        return None
+    return [table_name]
 
 
 @app.route('/api/authenticate', methods=['POST'])
@@ -33,22 +96,20 @@ def authenticate_api():
 
 @app.route('/api/events')
 @login_required
+@conditional(lambda: ())
 def events_api():
     """Returns a JSON consisting of the tables the user has the permission to view"""
     ret = {}
     log(f'<code>{current_user.name}</code> is accessing the list of events!')
     for table in get_accessible_tables():
-        if table.name not in (
-            'access',
-            'events',
-            'users',
-        ):
+        if table.name not in INTERNAL_TABLES:
             ret[table.name] = table.full_name
     return jsonify(ret), 200
 
 
 @app.route('/api/stats')
 @login_required
+@conditional(requested_tables)
 def stats_api():
     """Returns a JSON consisting of the tables the user has the permission to view and the users registered per table"""
     log(f'<code>{current_user.name}</code> is accessing the stats of events!')
@@ -58,31 +119,141 @@ def stats_api():
         if table is None:
             return jsonify({'message': f'Table {table_name} does not exist'}), 400
         if check_access(table_name):
+            counts = cached(
+                stats_cache,
+                [table_name],
+                table_name,
+                lambda: get_registration_counts([table_name]),
+            )
             return (
-                jsonify({get_table_full_name(table_name): len(table.query.all())}),
+                jsonify({get_table_full_name(table_name): counts[table_name]}),
                 200,
             )
         return (
             jsonify({'message': f'You do not have access to table {table}'}),
             403,
         )
+    tables = [
+        table
+        for table in get_accessible_tables()
+        if table.name not in INTERNAL_TABLES + ('test_users', 'tsg')
+    ]
+    names = [table.name for table in tables]
+    counts = cached(
+        stats_cache, names, tuple(names), lambda: get_registration_counts(names)
+    )
     ret = {}
-    for table in get_accessible_tables():
-        if table.name not in (
-            'access',
-            'events',
-            'test_users',
-            'tsg',
-            'users',
-        ):
-            ret[table.full_name] = len(get_table_by_name(table.name).query.all())
+    for table in tables:
+        if table.name in counts:
+            ret[table.full_name] = counts[table.name]
     return jsonify(ret), 200
 
 
+@app.route('/api/stats/timeline')
+@login_required
+def timeline_api():
+    """
+    Returns a JSON consisting of the number of registrations per hour or per day in the given table
+
+    Only the rollups are read, the event's table is never touched
+
+    -> table - The name of the table
+    -> granularity - `hour` or `day`, defaults to `hour`
+    -> since - Optional ISO 8601 timestamp (UTC) of the earliest bucket to return
+    """
+    table_name = request.args.get('table')
+    granularity = request.args.get('granularity', 'hour')
+    if not table_name:
+        return jsonify({'message': 'Please provide all required data'}), 400
+    if granularity not in ROLLUP_GRANULARITIES:
+        return jsonify({'message': f'Invalid granularity {granularity}'}), 400
+    if get_table_by_name(table_name) is None:
+        return jsonify({'message': f'Table {table_name} does not exist'}), 400
+    if not check_access(table_name):
+        return jsonify({'message': 'Unauthorized'}), 401
+
+    query = Rollup.query.filter(Rollup.event == table_name).filter(
+        Rollup.granularity == granularity
+    )
+    if 'since' in request.args:
+        try:
+            since = datetime.fromisoformat(request.args['since'])
+        except ValueError:
+            return jsonify({'message': 'Invalid value for since'}), 400
+        query = query.filter(Rollup.bucket >= since)
+
+    return (
+        jsonify(
+            {
+                'table': table_name,
+                'granularity': granularity,
+                'timeline': [
+                    {'bucket': rollup.bucket.isoformat(), 'count': rollup.count}
+                    for rollup in query.order_by(Rollup.bucket)
+                    if rollup.count
+                ],
+            }
+        ),
+        200,
+    )
+
+
+@app.route('/api/metrics')
+@login_required
+def metrics_api():
+    """Returns a JSON consisting of the metrics shared by all workers, such as admission control counters"""
+    return jsonify(get_metrics()), 200
+
+
+@app.route('/api/metrics/cache')
+@login_required
+def cache_metrics_api():
+    """
+    Returns a JSON consisting of the size of the cache, and the hit rate seen by the worker answering the request
+    """
+    return jsonify({'pid': os.getpid(), **backend.stats()}), 200
+
+
+@app.route('/api/waitlist')
+@login_required
+def waitlist_api():
+    """
+    Returns the IDs of the users on the waitlist of the given table, in the order they will be moved up
+
+    -> table - The name of the table
+    """
+    table_name = request.args.get('table')
+    if get_table_by_name(table_name) is None or table_name in INTERNAL_TABLES:
+        return jsonify({'message': f'Table {table_name} does not exist'}), 400
+    if not check_access(table_name):
+        return (
+            jsonify({'message': f'You are not authorized to access {table_name}'}),
+            401,
+        )
+    t = Waitlist.__table__
+    ids = db.session.execute(
+        select([t.c.user_id]).where(t.c.event == table_name).order_by(t.c.seq)
+    ).fetchall()
+    return jsonify({'waitlist': [user_id for (user_id,) in ids]})
+
+
 @app.route('/api/users')
 @login_required
+@conditional(requested_tables)
 def users_api():
-    """Returns a JSON consisting of the users in the given table"""
+    """
+    Returns a JSON consisting of the users in the given table
+
+    -> table - The name of the table, or `all` for the contact details of everyone in every table the user can access
+    -> fields - Optional comma separated list of the fields to be returned
+    -> limit - Optional number of users per page
+    -> after - Optional cursor, the `next` value returned with the previous page
+    -> format - Optional, `ndjson` to stream the users as newline delimited JSON, one per line
+    -> Any other parameter is a field that users must be equal to, for example `paid=yes`
+
+    With `limit` or `after`, the response is an object with the `users` in the page and the `next` cursor, which is
+    null on the last page. Otherwise it is the list of users.
+    """
     table_name = request.args.get('table')
     if not table_name:
         return jsonify({'message': 'Please provide all required data'}), 400
@@ -91,35 +262,274 @@ def users_api():
         log(
             f'<code>{current_user.name}</code> is accessing all tables that they have access to!'
         )
-        tables = get_accessible_tables()
-        users = set()
-        for table in tables:
-            if table.name in ('access', 'events', 'users'):
-                continue
-            table_users = get_table_by_name(table.name).query.all()
-            for user in table_users:
-                phone = (
-                    user.phone.split('|')[1]
-                    if len(user.phone.split('|')) == 2
-                    else user.phone
-                )
-                if ',' in user.name:
-                    continue
-                name = user.name.split(' ')[0].title()
-                users.add(dumps({'name': name, 'phone': phone}))
-        final_users = []
-        for user in users:
-            final_users.append(loads(user))
-        return jsonify(dumps(final_users)), 200
+        names = [
+            table.name
+            for table in get_accessible_tables()
+            if table.name not in INTERNAL_TABLES
+        ]
+        users = cached(
+            users_cache, names, ('contacts', tuple(names)), lambda: get_contacts(names)
+        )
+        # Charon expects the list encoded as a JSON string
+        return Response(dumps(encode(users).decode()), mimetype='application/json'), 200
 
     log(f'<code>{current_user.name}</code> is accessing table {table_name}!')
-    access = check_access(table_name)
-    if access is None:
+    if not check_access(table_name):
         return jsonify({'message': 'Unauthorized'}), 401
     table = get_table_by_name(table_name)
     if table is None:
         return jsonify({'message': f'Table {table_name} does not exist!'}), 400
-    return jsonify(users_to_json(table.query.all())), 200
+
+    # Without any of these, the whole table is returned as it always has been
+    if not set(request.args) - {'table'}:
+        users = cached(
+            users_cache,
+            [table_name],
+            ('json', table_name),
+            lambda: table_to_json(table),
+        )
+        return json_response(users)
+
+    columns = list(get_column_names(table))
+    fields = columns
+    if 'fields' in request.args:
+        fields = request.args['fields'].split(',')
+        for field in fields:
+            if field not in columns:
+                return jsonify({'message': f'{table_name} has no field {field}'}), 400
+
+    filters = {}
+    for k, v in request.args.items():
+        if k in ('table', 'fields', 'limit', 'after', 'format'):
+            continue
+        if k not in columns:
+            return jsonify({'message': f'{table_name} has no field {k}'}), 400
+        filters[k] = v
+
+    if request.args.get('format') == 'ndjson':
+        # Tables are streamed in chunks by ID (see `stream_rows`)
+        if 'id' not in columns:
+            return jsonify({'message': f'{table_name} cannot be streamed'}), 400
+        return stream_ndjson(table, fields, filters)
+
+    if 'limit' not in request.args and 'after' not in request.args:
+        return json_response(table_to_json(table, fields, filters))
+
+    if 'id' not in columns:
+        return jsonify({'message': f'{table_name} cannot be paginated'}), 400
+    try:
+        limit = min(int(request.args.get('limit', PAGE_SIZE)), MAX_PAGE_SIZE)
+        after = int(request.args['after']) if 'after' in request.args else None
+    except ValueError:
+        return jsonify({'message': 'limit and after must be numbers'}), 400
+    if limit < 1:
+        return jsonify({'message': 'limit must be at least 1'}), 400
+
+    # The ID is needed for the cursor, even if it wasn't asked for
+    selected = fields if 'id' in fields else fields + ['id']
+    rows = select_rows(table, selected, filters, after, limit)
+    return json_response(
+        {
+            'users': rows_to_json(fields, rows),
+            'next': rows[-1][selected.index('id')] if len(rows) == limit else None,
+        }
+    )
+
+
+def stream_ndjson(table, fields: list, filters: dict) -> Response:
+    """Streams the rows of a table as newline delimited JSON, reading them from the database in chunks"""
+
+    def generate():
+        for rows in stream_rows(table, fields, filters):
+            yield b''.join(encode(user) + b'\n' for user in rows_to_json(fields, rows))
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@app.route('/api/users/changes')
+@login_required
+def users_changes_api():
+    """
+    Returns the users in the given table which were inserted, updated or deleted since a cursor
+
+    -> table - The name of the table
+    -> since - Optional cursor, the `next` value returned by the previous call. Without it, every user is returned.
+    -> fields - Optional comma separated list of the fields to be returned
+
+    The response has the current values of the `users` inserted or updated, the IDs of those `deleted`, the `next`
+    cursor, and whether there are `more` changes to be fetched right away. A 410 means that the cursor is older than
+    the change log, and the whole table has to be fetched again without one.
+    """
+    table_name = request.args.get('table')
+    if not table_name:
+        return jsonify({'message': 'Please provide all required data'}), 400
+    if not check_access(table_name):
+        return jsonify({'message': 'Unauthorized'}), 401
+    table = get_table_by_name(table_name)
+    if table is None or table_name in INTERNAL_TABLES:
+        return jsonify({'message': f'Table {table_name} does not exist!'}), 400
+
+    columns = get_column_names(table)
+    fields = list(columns)
+    if 'fields' in request.args:
+        fields = request.args['fields'].split(',')
+        for field in fields:
+            if field not in columns:
+                return jsonify({'message': f'{table_name} has no field {field}'}), 400
+        if 'id' not in fields:
+            fields.append('id')
+    try:
+        since = int(request.args['since']) if 'since' in request.args else None
+    except ValueError:
+        return jsonify({'message': 'since must be a number'}), 400
+
+    log(f'<code>{current_user.name}</code> is syncing table {table_name}!')
+    t = Change.__table__
+    # The last change to this table which has been deleted from the log, changes after it are all still there
+    purged = (
+        db.session.execute(
+            select([ChangePurge.seq]).where(ChangePurge.event == table_name)
+        ).scalar()
+        or 0
+    )
+    if since is None:
+        # The cursor is read first, so that changes made while the table is read are sent again rather than missed
+        cursor = db.session.execute(
+            select([func.coalesce(func.max(t.c.seq), 0)]).where(t.c.event == table_name)
+        ).scalar()
+        return json_response(
+            {
+                'users': table_to_json(table, fields),
+                'deleted': [],
+                'next': max(cursor, purged),
+                'more': False,
+            }
+        )
+
+    if since < purged:
+        return jsonify({'message': 'The cursor has expired, please sync again'}), 410
+
+    changes = db.session.execute(
+        select([t.c.seq, t.c.user_id, t.c.op])
+        .where(and_(t.c.event == table_name, t.c.seq > since))
+        .order_by(t.c.seq)
+        .limit(CHANGES_PAGE_SIZE)
+    ).fetchall()
+    # Only the last change to each user matters
+    ops = {user_id: op for _, user_id, op in changes}
+    updated = [user_id for user_id, op in ops.items() if op == 'u']
+    deleted = {user_id for user_id, op in ops.items() if op == 'd'}
+
+    users = []
+    if updated:
+        query = build_select(table, fields).where(table.__table__.c.id.in_(updated))
+        users = rows_to_json(fields, db.session.execute(query).fetchall())
+        # Users missing by now were deleted by a change after this page
+        deleted |= set(updated) - {user['id'] for user in users}
+
+    return json_response(
+        {
+            'users': users,
+            'deleted': sorted(deleted),
+            'next': changes[-1][0] if changes else since,
+            'more': len(changes) == CHANGES_PAGE_SIZE,
+        }
+    )
+
+
+def run_batched(user, headers: dict, sub_request) -> dict:
+    """
+    Function to run one request of a batch
+    :param user: The user who made the batch
+    :param headers: Headers of the batch request, which every request in it is made with
+    :param sub_request: The request, see `batch_api`
+    :return: Dictionary with the status and body of the response
+    """
+    if (
+        not isinstance(sub_request, dict)
+        or not str(sub_request.get('path', '')).startswith('/api/')
+        or not isinstance(sub_request.get('headers', {}), dict)
+        or not isinstance(sub_request.get('data', ''), (dict, str))
+    ):
+        return {'status': 400, 'body': {'message': 'Please provide all required data'}}
+
+    ctx = app.test_request_context(
+        sub_request['path'],
+        base_url=request.host_url,
+        method=str(sub_request.get('method', 'GET')).upper(),
+        data=sub_request.get('data'),
+        headers={**headers, **sub_request.get('headers', {})},
+    )
+    with ctx:
+        # Flask-Login uses the user stored in the request context, rather than authenticating the request again
+        ctx.user = user
+        if request.endpoint in UNBATCHABLE_ENDPOINTS:
+            return {
+                'status': 400,
+                'body': {'message': f'{request.path} cannot be part of a batch'},
+            }
+        try:
+            response = app.make_response(app.dispatch_request())
+        except HTTPException as e:
+            response = app.make_response(app.handle_user_exception(e))
+        except Exception:
+            # One failing request shouldn't lose the responses of the others, which may already have made changes
+            app.logger.exception(f'Batched request to {request.path} failed')
+            db.session.rollback()
+            return {
+                'status': 500,
+                'body': {'message': f'{request.path} failed, please try again later'},
+            }
+
+        ret = {'status': response.status_code}
+        if response.is_json:
+            ret['body'] = response.get_json()
+        else:
+            ret['body'] = response.get_data(as_text=True)
+        if 'ETag' in response.headers:
+            ret['etag'] = response.headers['ETag']
+        return ret
+
+
+@app.route('/api/batch', methods=['POST'])
+@login_required
+def batch_api():
+    """
+    Runs several API requests at once, authenticating only once, and returns all of their responses
+
+    The body is a JSON list of requests, each of them an object with
+    -> path - The path of the request along with its query string, for example `/api/users?table=bov_2020`
+    -> method - Optional, GET by default
+    -> data - Optional form data, as an object
+    -> headers - Optional object of extra headers, for example `If-None-Match`
+
+    The response is a list with the `status`, `body` and `etag` (if any) of each response, in the same order.
+    Requests are run one after the other, and the messages they log are sent together at the end. A request which
+    fails with an unexpected error gets a 500 of its own, and the ones after it still run.
+    """
+    sub_requests = request.get_json(silent=True)
+    if not isinstance(sub_requests, list) or not sub_requests:
+        return jsonify({'message': 'Please provide all required data'}), 400
+    if len(sub_requests) > MAX_BATCH_SIZE:
+        return (
+            jsonify({'message': f'A batch can have at most {MAX_BATCH_SIZE} requests'}),
+            400,
+        )
+
+    user = current_user._get_current_object()
+    headers = {
+        k: v
+        for k, v in request.headers.items()
+        if k not in ('Content-Type', 'Content-Length')
+    }
+    g.batched_log = []
+    try:
+        responses = [run_batched(user, headers, sub) for sub in sub_requests]
+    finally:
+        messages = g.pop('batched_log')
+    if messages:
+        log('\n'.join(messages))
+    return json_response(responses)
 
 
 @app.route('/api/create', methods=['POST'])
@@ -135,8 +545,7 @@ def create():
     if table is None:
         return jsonify({'message': f'Table {table_name} does not seem to exist!'}, 400)
 
-    access = check_access(table_name)
-    if access is None:
+    if not check_access(table_name):
         return jsonify({'message': 'Unauthorized'}), 401
 
     log(
@@ -146,7 +555,7 @@ def create():
     user_data = {}
 
     for k, v in request.form.items():
-        if k == 'table':
+        if k in ('table', 'created_at'):
             continue
         user_data[k] = v
 
@@ -159,6 +568,8 @@ def create():
         log(e)
         return jsonify({'message': 'Exception occurred trying to create user'}), 400
 
+    # Admins may add registrants beyond the capacity, but the counter has to stay exact
+    claim_seat(table, force=True)
     success, reason = insert([user])
 
     if not success:
@@ -166,16 +577,146 @@ def create():
             jsonify({'message': f'Error occurred, {reason}'}),
             400,
         )
+    publish(table_name, 1)
     log(
         f'User <code>{user}</code> has been created in table <code>{table_name}</code>!',
     )
     return jsonify({'message': f'Created user {user} successfully!'}), 200
 
 
+def read_import() -> list:
+    """
+    Function to read the users to be imported from the request
+    :return: List of dictionaries of the values of the users, None if the request has none
+    """
+    upload = request.files.get('file')
+    if upload is not None:
+        if upload.filename.lower().endswith('.json'):
+            return loads(upload.read())
+        data = io.TextIOWrapper(upload.stream, encoding='utf-8-sig')
+    elif request.mimetype == 'text/csv':
+        data = io.StringIO(request.get_data(as_text=True))
+    else:
+        return request.get_json(silent=True)
+    # Empty cells are missing values rather than empty strings
+    return [
+        {k: v if v != '' else None for k, v in row.items()}
+        for row in csv.DictReader(data)
+    ]
+
+
+@app.route('/api/import', methods=['POST'])
+@login_required
+def import_users():
+    """
+    Imports many users into a table at once, reporting the users which could not be imported
+
+    -> table - The name of the table, in the query string or the form
+    -> The users, as a JSON array of objects, or a CSV with a header row either as the body or uploaded as `file`
+    (which may also be a `.json` file)
+
+    Users are checked against each other and the users already in the table before anything is inserted, and are
+    inserted in chunks of `BULK_CHUNK_SIZE`, each in its own transaction
+    """
+    table_name = request.args.get('table') or request.form.get('table')
+    if not table_name:
+        return jsonify({'message': 'Please provide the table name!'}), 400
+
+    table = get_table_by_name(table_name)
+    if table is None:
+        return jsonify({'message': f'Table {table_name} does not seem to exist!'}), 400
+
+    if not check_access(table_name):
+        return jsonify({'message': 'Unauthorized'}), 401
+
+    try:
+        rows = read_import()
+    except (ValueError, csv.Error) as e:
+        return jsonify({'message': f'Could not read the users - {e}'}), 400
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        return jsonify({'message': 'Please provide a list of users'}), 400
+    if len(rows) > MAX_IMPORT_SIZE:
+        return (
+            jsonify({'message': f'At most {MAX_IMPORT_SIZE} users can be imported'}),
+            400,
+        )
+
+    columns = get_column_names(table)
+    fields = {k for row in rows for k in row} - {'created_at'}
+    unknown = fields - set(columns)
+    if unknown:
+        return (
+            jsonify({'message': f'Unknown columns {", ".join(sorted(unknown))}'}),
+            400,
+        )
+
+    log(
+        f'<code>{current_user.name}</code> is trying to import {len(rows)} users into table {table_name}!'
+    )
+    # Every row has the same keys, as executemany requires
+    fields = sorted(fields | {'id'})
+    rows = [{k: row.get(k) for k in fields} for row in rows]
+    errors = {
+        i: f'id {row["id"]} is not a number'
+        for i, row in enumerate(rows)
+        if row['id'] is not None and not str(row['id']).isdigit()
+    }
+    for i, message in find_invalid_rows(table, rows).items():
+        errors.setdefault(i, message)
+
+    # Users without an ID are given the ones after the highest in the table or the import
+    next_id = max(
+        [get_current_id(table)]
+        + [
+            int(row['id']) + 1
+            for i, row in enumerate(rows)
+            if i not in errors and row['id'] is not None
+        ]
+    )
+    valid = []
+    for i, row in enumerate(rows):
+        if i in errors:
+            continue
+        if row['id'] is None:
+            row['id'] = next_id
+            next_id += 1
+        valid.append(i)
+
+    inserted = 0
+    for start in range(0, len(valid), CHUNK_SIZE):
+        chunk = valid[start : start + CHUNK_SIZE]
+        success, reason = insert_rows(table, [rows[i] for i in chunk])
+        if success:
+            inserted += len(chunk)
+            # Every chunk is a transaction of its own, which streams have to see separately
+            publish(table_name, len(chunk))
+        else:
+            errors.update({i: reason for i in chunk})
+
+    log(
+        f'<code>{current_user.name}</code> has imported {inserted} of {len(rows)} users into table {table_name}!'
+    )
+    return jsonify(
+        {
+            'message': f'Imported {inserted} users into {table_name}',
+            'inserted': inserted,
+            'failed': len(errors),
+            'errors': [
+                {'row': i, 'message': message} for i, message in sorted(errors.items())
+            ],
+        }
+    )
+
+
 @app.route('/api/delete', methods=['DELETE'])
 @login_required
 def delete():
-    """Deletes the user as specified in the request data"""
+    """
+    Deletes the users as specified in the request data
+
+    -> table - The name of the table
+    -> id - The ID of the user, `all` for every user, or a list (`1,2,5`) or range (`10-20`) of IDs
+    """
 
     # TODO: use utils.delete_user()
     # Ensure user has passed `table` and `id`
@@ -186,8 +727,7 @@ def delete():
         return jsonify({'message': 'Please provide all required data'}), 400
 
     # Confirm that the user has access to the desired table
-    access = check_access(table_name)
-    if access is None:
+    if not check_access(table_name):
         return (
             jsonify({'message': f'You are not authorized to access {table_name}'}),
             401,
@@ -197,25 +737,40 @@ def delete():
     if table is None:
         return jsonify({'message': f'{table_name} does not seem to exist!'}), 400
 
-    # Let us delete all entries, if so required
-    if id_ == 'all':
+    # Many users are deleted at once, with `all`, a list like `1,2,5` or a range like `10-20`
+    if id_ == 'all' or ',' in id_ or '-' in id_:
+        ids = first = last = None
+        try:
+            if ',' in id_:
+                ids = [int(i) for i in id_.split(',')]
+            elif '-' in id_:
+                first, last = (int(i) for i in id_.split('-'))
+        except ValueError:
+            return jsonify({'message': f'{id_} is not a list or range of IDs'}), 400
+        count, reason = delete_rows(table, ids, first, last)
+        if reason:
+            log(f'Could not delete users {id_} from {table_name} - {reason}!')
+            return (
+                jsonify({'message': f'Failed to delete users from {table_name}'}),
+                500,
+            )
+        if count:
+            publish(table_name, -count)
         log(
-            f'<code>{current_user.name}</code> is trying to delete all entries from table {table_name}!'
+            f'<code>{current_user.name}</code> has deleted {count} users ({id_}) from table {table_name}!'
+        )
+        log_promotions()
+        return jsonify(
+            {'message': f'Deleted {count} users from {table_name}', 'deleted': count}
         )
-        # Store the message to be returned
-        ret = []
-        for user in table.query.all():
-            if delete_user(user.id, table_name):
-                ret.append(f'Deleted user {user} from {table_name}')
-            else:
-                ret.append(f'Failed to delete user {user} from {table_name}')
-        return jsonify({'message': ret})
 
     log(
         f'<code>{current_user.name}</code> is trying to delete ID {id_} from table {table_name}!'
     )
     # If just a specific ID is to be deleted
-    if delete_user(id_, table_name):
+    success, _ = delete_user(id_, table_name)
+    if success:
+        publish(table_name, -1)
         return jsonify({'message': f'Deleted user with id {id_} from {table_name}'})
     return jsonify(
         {'message': f'Failed to delete user with id {id_} from {table_name}'}
@@ -249,8 +804,7 @@ def update_user():
     else:
         return jsonify({'message': 'Please provide all required data'}), 400
 
-    access = check_access(table_name)
-    if access is None:
+    if not check_access(table_name):
         return jsonify({'message': 'Unauthorized'}), 401
 
     table = get_table_by_name(table_name)
@@ -288,6 +842,110 @@ def update_user():
     return jsonify({'message': f'Updated user {user}'}), 200
 
 
+@app.route('/api/update/bulk', methods=['PUT'])
+@login_required
+def bulk_update():
+    """
+    Updates many users of a table at once, reporting the users which could not be updated
+
+    -> table - The name of the table
+    -> users - List of patches, each with the `id` of a user and the new values of the attributes to be updated
+
+    Users are updated in chunks of `BULK_CHUNK_SIZE`, each in its own transaction. When a chunk violates a constraint,
+    its users are updated one at a time to find the ones which do.
+    """
+    data = request.get_json(silent=True)
+    if (
+        not isinstance(data, dict)
+        or not data.get('table')
+        or not isinstance(data.get('users'), list)
+    ):
+        return jsonify({'message': 'Please provide all required data'}), 400
+    table_name, patches = data['table'], data['users']
+    if len(patches) > MAX_UPDATE_SIZE:
+        return (
+            jsonify({'message': f'At most {MAX_UPDATE_SIZE} users can be updated'}),
+            400,
+        )
+
+    if not check_access(table_name):
+        return jsonify({'message': 'Unauthorized'}), 401
+
+    table = get_table_by_name(table_name)
+    if table is None:
+        return jsonify({'message': 'Please provide a valid table name'}), 400
+
+    columns = set(get_column_names(table)) - {'id', 'created_at'}
+    errors = {}
+    mappings = {}
+    seen = set()
+    for i, patch in enumerate(patches):
+        if not isinstance(patch, dict) or not isinstance(patch.get('id'), int):
+            errors[i] = 'Every user needs an id'
+            continue
+        unknown = sorted(set(patch) - columns - {'id'})
+        if unknown:
+            errors[i] = f'Unknown columns {", ".join(unknown)}'
+        elif len(patch) == 1:
+            errors[i] = 'Nothing to update'
+        elif patch['id'] in seen:
+            errors[i] = f'User {patch["id"]} appears more than once'
+        else:
+            mappings[i] = patch['id']
+            seen.add(patch['id'])
+
+    # Users which don't exist are reported rather than silently left alone
+    t = table.__table__
+    existing = set()
+    for chunk in chunks(list(mappings.values()), CHUNK_SIZE):
+        existing.update(
+            id_
+            for (id_,) in db.session.execute(select([t.c.id]).where(t.c.id.in_(chunk)))
+        )
+    for i, id_ in list(mappings.items()):
+        if id_ not in existing:
+            errors[i] = f'User {id_} does not exist'
+            del mappings[i]
+
+    log(
+        f'<code>{current_user.name}</code> is trying to update {len(patches)} users in table {table_name}!'
+    )
+    updated = []
+    for chunk in chunks(list(mappings), CHUNK_SIZE):
+        success, reason = update_rows(table, [patches[i] for i in chunk])
+        if success:
+            updated += chunk
+            continue
+        for i in chunk:
+            success, reason = update_rows(table, [patches[i]])
+            if success:
+                updated.append(i)
+            else:
+                errors[i] = reason
+
+    if updated:
+        # One message for the whole update, which has to stay within the length Telegram allows
+        fields = Counter(k for i in updated for k in patches[i] if k != 'id')
+        ids = ', '.join(str(patches[i]['id']) for i in updated[:100])
+        if len(updated) > 100:
+            ids += f' and {len(updated) - 100} more'
+        log(
+            f'<code>{current_user.name}</code> has updated {len(updated)} users in table <code>{table_name}</code>: '
+            + ', '.join(f'{k} of {count}' for k, count in sorted(fields.items()))
+            + f' (IDs {ids})'
+        )
+    return jsonify(
+        {
+            'message': f'Updated {len(updated)} users in {table_name}',
+            'updated': len(updated),
+            'failed': len(errors),
+            'errors': [
+                {'row': i, 'message': message} for i, message in sorted(errors.items())
+            ],
+        }
+    )
+
+
 @app.route('/api/sendmail', methods=['POST'])
 @login_required
 def sendmail():
@@ -299,10 +957,9 @@ def sendmail():
     subject = request.form['subject']
     table_name = request.form['table']
 
-    if table_name in ('access', 'events', 'users'):
+    if table_name in INTERNAL_TABLES:
         return jsonify({'message': 'Seriously?'}), 400
-    access = check_access(table_name)
-    if access is None:
+    if not check_access(table_name):
         return jsonify({'message': 'Unauthorized'}), 401
 
     log(f'<code>{current_user.name}</code> is send a mail to table {table_name}!')
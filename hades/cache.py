@@ -0,0 +1,358 @@
+"""
+Caches shared by the workers
+
+Entries live in a backend, either an in-process LRU (`LRUCache`) or a SQLite database in `STATE_DIR` which all workers
+on the host read and write (`SharedCache`), chosen with `CACHE_BACKEND`. Caches are split into namespaces, each with a
+version number kept in the shared database. Invalidating a namespace bumps its version, so that every worker stops
+using the old entries on its next lookup, and the old entries age out of the backend.
+
+Namespaces may name the tables their entries are read from, in which case they are invalidated right after any
+transaction changing those tables is committed. Results keyed by the versions of the tables they were read from (see
+`cached()` and `db_utils.bump_versions`) never need to be invalidated at all.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from random import random
+
+from decouple import config
+from sqlalchemy import event
+
+from . import db
+from .db_utils import ACCESS_TABLES, get_versions
+from .shared import connect
+
+MISSING = object()
+
+
+def encode_value(obj):
+    """Encodes the values JSON has no type for which are cached, keeping their type"""
+    if isinstance(obj, datetime):
+        return {'__datetime__': obj.isoformat()}
+    raise TypeError(f'{type(obj).__name__} cannot be cached')
+
+
+def decode_value(obj: dict):
+    if '__datetime__' in obj:
+        return datetime.fromisoformat(obj['__datetime__'])
+    return obj
+
+
+def dumps(value) -> bytes:
+    """
+    Function to serialize a value to be cached
+
+    Values are stored as JSON rather than pickled, as reading a pickle from the shared database would run any code
+    written into it. Tuples come back as lists.
+    :param value: The value, made of JSON types and datetimes
+    :return: The JSON as bytes
+    """
+    return json.dumps(value, separators=(',', ':'), default=encode_value).encode()
+
+
+def loads(data: bytes):
+    return json.loads(data, object_hook=decode_value)
+
+
+CACHE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires REAL,
+    stored REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_stored ON entries (stored);
+CREATE TABLE IF NOT EXISTS namespaces (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+'''
+
+
+class LRUCache:
+    """
+    Class implementing an in-process least recently used cache, bounded by the total (serialized) size of its values
+
+    Has various functions
+
+    -> get: returns the value stored under a key, MISSING if there is none or it has expired
+    -> set: stores a value under a key, evicting the least recently used entries to make room for it
+    -> clear: removes all entries
+    -> stats: returns the number of entries, their size, hits, misses, evictions and the hit rate
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: str):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or (entry[2] is not None and entry[2] <= time.time()):
+                self.misses += 1
+                return MISSING
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: str, value, ttl: float = None):
+        try:
+            size = len(dumps(value))
+        except TypeError:
+            return
+        if size > self.max_size:
+            return
+        expires = None if ttl is None else time.time() + ttl
+        with self.lock:
+            if key in self.entries:
+                self.size -= self.entries.pop(key)[1]
+            while self.entries and self.size + size > self.max_size:
+                self.size -= self.entries.popitem(last=False)[1][1]
+                self.evictions += 1
+            self.entries[key] = (value, size, expires)
+            self.size += size
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': 'local',
+                'entries': len(self.entries),
+                'size': self.size,
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+            }
+
+
+class SharedCache:
+    """
+    Class implementing a cache in a SQLite database shared by all workers on the host, bounded by the total size of
+    its (serialized) values
+
+    Has the same functions as `LRUCache`. Entries are evicted oldest first, and only now and then, so that storing an
+    entry stays cheap. Hits and misses are counted per worker.
+    """
+
+    def __init__(self, max_size: int, name: str = 'cache.db'):
+        self.max_size = max_size
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def connect(self):
+        return connect(CACHE_SCHEMA, self.name)
+
+    def get(self, key: str):
+        row = (
+            self.connect()
+            .execute(
+                'SELECT value FROM entries WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (key, time.time()),
+            )
+            .fetchone()
+        )
+        if row is None:
+            self.misses += 1
+            return MISSING
+        try:
+            value = loads(row[0])
+        except ValueError:
+            # Written in another format, by an older version
+            self.misses += 1
+            return MISSING
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value, ttl: float = None):
+        try:
+            data = dumps(value)
+        except TypeError:
+            return
+        if len(data) > self.max_size:
+            return
+        now = time.time()
+        self.connect().execute(
+            'INSERT OR REPLACE INTO entries (key, value, size, expires, stored) VALUES (?, ?, ?, ?, ?)',
+            (key, data, len(data), None if ttl is None else now + ttl, now),
+        )
+        if random() < 0.1:
+            self.evict(now)
+
+    def evict(self, now: float):
+        """Removes the expired entries, and the oldest ones beyond the maximum size"""
+        conn = self.connect()
+        expired = conn.execute(
+            'DELETE FROM entries WHERE expires <= ?', (now,)
+        ).rowcount
+        evicted = conn.execute(
+            'DELETE FROM entries WHERE key IN (SELECT key FROM ('
+            'SELECT key, sum(size) OVER (ORDER BY stored DESC) AS total FROM entries'
+            ') WHERE total > ?)',
+            (self.max_size,),
+        ).rowcount
+        self.evictions += expired + evicted
+
+    def clear(self):
+        self.connect().execute('DELETE FROM entries')
+
+    def stats(self) -> dict:
+        entries, size = (
+            self.connect()
+            .execute('SELECT count(*), coalesce(sum(size), 0) FROM entries')
+            .fetchone()
+        )
+        lookups = self.hits + self.misses
+        return {
+            'backend': 'shared',
+            'entries': entries,
+            'size': size,
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+        }
+
+
+def get_namespace_version(name: str) -> int:
+    """Returns the current version of a namespace"""
+    row = (
+        connect(CACHE_SCHEMA, 'cache.db')
+        .execute('SELECT version FROM namespaces WHERE name = ?', (name,))
+        .fetchone()
+    )
+    return 0 if row is None else row[0]
+
+
+def invalidate(*names: str):
+    """
+    Function to invalidate namespaces in every worker on the host
+    :param names: Names of the namespaces
+    """
+    connect(CACHE_SCHEMA, 'cache.db').executemany(
+        'INSERT INTO namespaces (name, version) VALUES (?, 1) '
+        'ON CONFLICT (name) DO UPDATE SET version = version + 1',
+        [(name,) for name in names],
+    )
+
+
+# All namespaces, by name
+NAMESPACES = {}
+
+
+class Namespace:
+    """
+    Class representing a group of cache entries which are invalidated together
+
+    -> name: Name of the namespace, unique among all namespaces
+    -> backend: The `LRUCache` or `SharedCache` holding the entries
+    -> ttl: Seconds after which entries expire, None to keep them until they are evicted or invalidated
+    -> tables: Names of the tables whose changes invalidate the namespace
+    """
+
+    def __init__(self, name: str, backend, ttl: float = None, tables: tuple = ()):
+        self.name = name
+        self.backend = backend
+        self.ttl = ttl
+        self.tables = frozenset(tables)
+        NAMESPACES[name] = self
+
+    def make_key(self, key) -> str:
+        return f'{self.name}:{get_namespace_version(self.name)}:{key!r}'
+
+    def get(self, key):
+        """Returns the value stored under a key, MISSING if there is none"""
+        return self.backend.get(self.make_key(key))
+
+    def set(self, key, value):
+        self.backend.set(self.make_key(key), value, self.ttl)
+
+    def get_or_set(self, key, compute):
+        """
+        Function to get a value from the namespace, computing and storing it if it is not there
+        :param key: The key, which must have a stable `repr()`
+        :param compute: Function computing the value, which must not be modified by the caller
+        :return: The value
+        """
+        full_key = self.make_key(key)
+        value = self.backend.get(full_key)
+        if value is MISSING:
+            value = compute()
+            self.backend.set(full_key, value, self.ttl)
+        return value
+
+    def invalidate(self):
+        invalidate(self.name)
+
+
+def cached(namespace: Namespace, tables: list, key, compute):
+    """
+    Function to get a result from the cache, computing and storing it if it is not there
+
+    The result is stored under the versions of the tables it is computed from, so it is never stale. This costs one
+    query for the versions, the computation only runs on a miss.
+    :param namespace: Namespace of the result
+    :param tables: Names of the tables the result is computed from
+    :param key: Anything else the result depends on, which must have a stable `repr()`
+    :param compute: Function computing the result, which must not be modified by the caller
+    :return: The result
+    """
+    versions = get_versions(tables)
+    return namespace.get_or_set(
+        (
+            key,
+            tuple((name, versions.get(name, (0, None))[0]) for name in sorted(tables)),
+        ),
+        compute,
+    )
+
+
+@event.listens_for(db.session, 'after_commit')
+def invalidate_changed_namespaces(session):
+    """Invalidates the namespaces depending on the tables changed in a transaction, once it has been committed"""
+    changed = session.info.pop('committed_tables', None)
+    if changed:
+        names = [ns.name for ns in NAMESPACES.values() if ns.tables & changed]
+        if names:
+            invalidate(*names)
+
+
+# Maximum size of the cached entries in bytes, per worker for the local backend and in total for the shared one
+CACHE_SIZE = config('CACHE_SIZE', default=16 * 1024 * 1024, cast=int)
+
+if config('CACHE_BACKEND', default='shared') == 'local':
+    backend = LRUCache(CACHE_SIZE)
+else:
+    backend = SharedCache(CACHE_SIZE)
+
+# Seconds for which the access caches are trusted, in case the tables are changed from another host
+ACCESS_TTL = config('ACCESS_CACHE_TTL', default=300, cast=float)
+
+# Tables each user can access
+access_cache = Namespace(
+    'access', backend, ACCESS_TTL, tables=ACCESS_TABLES + ('users',)
+)
+# Full names of the tables
+events_cache = Namespace('events', backend, ACCESS_TTL, tables=('events',))
+# Number of users registered per table
+stats_cache = Namespace('stats', backend)
+# Users in the tables, in the forms returned by the APIs and pages
+users_cache = Namespace('users', backend)
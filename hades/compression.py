@@ -0,0 +1,164 @@
+"""
+Compression of responses
+
+Responses of a compressible type are compressed with brotli (when the `brotli` package is installed) or gzip,
+whichever the client prefers, once they are at least `COMPRESSION_MIN_SIZE` bytes long. Streamed responses are
+compressed chunk by chunk, flushing after every chunk so that events still reach the client as soon as they are sent.
+The levels default to ones which give most of the reduction in size for a fraction of the CPU time of the highest.
+
+The size before and after compression, and the CPU time spent on it, are recorded per endpoint in the shared metrics
+as `compression.<endpoint>.bytes_in`, `.bytes_out` and `.cpu_seconds`.
+"""
+
+import time
+import zlib
+
+from decouple import config
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from . import app
+from .shared import incr_many
+
+COMPRESSION = config('COMPRESSION', default=True, cast=bool)
+
+# Responses smaller than this (in bytes) are sent as they are, as compressing them would hardly save anything
+MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=1024, cast=int)
+
+GZIP_LEVEL = config('COMPRESSION_GZIP_LEVEL', default=5, cast=int)
+BROTLI_QUALITY = config('COMPRESSION_BROTLI_QUALITY', default=4, cast=int)
+
+COMPRESSIBLE_TYPES = (
+    'application/javascript',
+    'application/json',
+    'application/x-ndjson',
+    'image/svg+xml',
+)
+
+
+class Compressor:
+    """
+    Class wrapping the compressor of one of the supported encodings
+
+    Has various functions
+
+    -> compress: returns the compressed data for a chunk, flushed (unless told not to) so that it can be decompressed
+    as is
+    -> finish: returns the end of the compressed data
+    """
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == 'br':
+            self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            # A window of 31 bits makes zlib write a gzip header
+            self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, flush: bool = True) -> bytes:
+        if self.encoding == 'br':
+            data = self.compressor.process(data)
+            return data + self.compressor.flush() if flush else data
+        data = self.compressor.compress(data)
+        return data + self.compressor.flush(zlib.Z_SYNC_FLUSH) if flush else data
+
+    def finish(self) -> bytes:
+        if self.encoding == 'br':
+            return self.compressor.finish()
+        return self.compressor.flush()
+
+
+def get_encoding():
+    """Returns the encoding preferred by the client, None if it accepts none of the supported ones"""
+    encodings = request.accept_encodings
+    br = encodings['br'] if brotli else 0
+    gzip = encodings['gzip']
+    if not br and not gzip:
+        return None
+    return 'br' if br >= gzip else 'gzip'
+
+
+def is_compressible(response: Response) -> bool:
+    """Returns whether a response should be compressed, leaving aside its size"""
+    return (
+        response.status_code == 200
+        and not response.direct_passthrough
+        and 'Content-Encoding' not in response.headers
+        and (
+            response.mimetype.startswith('text/')
+            or response.mimetype in COMPRESSIBLE_TYPES
+        )
+    )
+
+
+def record(endpoint: str, bytes_in: int, bytes_out: int, cpu_seconds: float):
+    prefix = f'compression.{endpoint}'
+    incr_many(
+        {
+            f'{prefix}.bytes_in': bytes_in,
+            f'{prefix}.bytes_out': bytes_out,
+            f'{prefix}.cpu_seconds': cpu_seconds,
+        }
+    )
+
+
+def compress_stream(iterable, compressor: Compressor, endpoint: str, charset: str):
+    """Compresses a streamed response chunk by chunk, recording the metrics once it ends"""
+    bytes_in = bytes_out = 0
+    cpu_seconds = 0
+    try:
+        for chunk in iterable:
+            if isinstance(chunk, str):
+                chunk = chunk.encode(charset)
+            start = time.thread_time()
+            data = compressor.compress(chunk)
+            cpu_seconds += time.thread_time() - start
+            bytes_in += len(chunk)
+            bytes_out += len(data)
+            if data:
+                yield data
+        data = compressor.finish()
+        bytes_out += len(data)
+        yield data
+    finally:
+        if hasattr(iterable, 'close'):
+            iterable.close()
+        record(endpoint, bytes_in, bytes_out, cpu_seconds)
+
+
+@app.after_request
+def compress(response: Response) -> Response:
+    """Compresses the response, if it is worth it and the client accepts it"""
+    if not COMPRESSION or not is_compressible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = get_encoding()
+    if encoding is None:
+        return response
+
+    endpoint = request.endpoint or 'unknown'
+    compressor = Compressor(encoding)
+    if response.is_streamed:
+        response.response = compress_stream(
+            response.response, compressor, endpoint, response.charset
+        )
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < MIN_SIZE:
+            return response
+        start = time.thread_time()
+        compressed = compressor.compress(data, flush=False) + compressor.finish()
+        record(endpoint, len(data), len(compressed), time.thread_time() - start)
+        response.set_data(compressed)
+
+    response.headers['Content-Encoding'] = encoding
+    # The compressed body differs byte for byte, but not in meaning
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
@@ -1,10 +1,52 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from random import random
 from typing import Union, List
 
+from decouple import config
 from flask_sqlalchemy import Model
+from sqlalchemy import (
+    Table,
+    and_,
+    case,
+    event,
+    func,
+    insert as sql_insert,
+    or_,
+    select,
+    update,
+)
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
 from sqlalchemy.exc import DataError, IntegrityError
 
 from hades import db
+from hades.models.capacity import Capacity
+from hades.models.change import Change
+from hades.models.change_purge import ChangePurge
+from hades.models.rollup import Rollup
+from hades.models.timestamp import TimestampMixin
 from hades.models.user import TSG
+from hades.models.version import TableVersion
+from hades.models.waitlist import Waitlist
+
+# Tables the access of users to events is resolved from, which every access controlled response depends on
+ACCESS_TABLES = ('access', 'events', 'group_access', 'groups', 'memberships')
+
+# Granularities of the registration rollups, along with the function giving the bucket a timestamp falls into
+ROLLUP_GRANULARITIES = {
+    'hour': lambda at: at.replace(minute=0, second=0, microsecond=0),
+    'day': lambda at: at.replace(hour=0, minute=0, second=0, microsecond=0),
+}
+
+# Number of rows written with one statement by bulk operations
+CHUNK_SIZE = config('BULK_CHUNK_SIZE', default=1000, cast=int)
+
+# Columns searched on the /events page and by the search API, where the table has them
+SEARCH_COLUMNS = ('name', 'email', 'phone', 'prn')
+
+# Days for which the change log is kept, clients which last synced before that have to fetch whole tables again
+CHANGE_RETENTION_DAYS = config('CHANGE_RETENTION_DAYS', default=30, cast=int)
 
 
 def insert(objects: List[Model]) -> (bool, str):
@@ -14,7 +56,12 @@ def insert(objects: List[Model]) -> (bool, str):
     :return: success, and reason if failure (empty on success)
     """
     try:
+        now = datetime.utcnow()
         for user in objects:
+            if isinstance(user, TimestampMixin):
+                if user.created_at is None:
+                    user.created_at = now
+                update_rollups(type(user), user.created_at, 1)
             db.session.add(user)
         db.session.commit()
     except IntegrityError as e:
@@ -45,6 +92,129 @@ def get_data_from_table(table: Model) -> Union[list, None]:
     return table.query.all()
 
 
+def build_select(
+    table: Model,
+    columns: List[str],
+    filters: dict = None,
+    after: int = None,
+    limit: int = None,
+    sort: str = None,
+    descending: bool = False,
+    search: tuple = None,
+    offset: int = None,
+):
+    """
+    Function to build a SELECT of some columns of the rows of a table
+
+    Rows are ordered by `id` when paginating, so that `after` can be the last ID of the previous page (keyset
+    pagination), which costs the same however deep into the table the page is
+    :param table: The table whose rows are to be retrieved
+    :param columns: Names of the columns to be selected
+    :param filters: Dictionary of column names and values the rows must be equal to
+    :param after: Only return rows with an ID greater than this
+    :param limit: Maximum number of rows to be returned
+    :param sort: Column to order the rows by instead, followed by the primary key to break ties
+    :param descending: Whether the rows are sorted in descending order
+    :param search: Tuple of a prefix and the names of the columns, one of which must start with it
+    :param offset: Number of rows to be skipped
+    :return: The SELECT statement
+    """
+    t = table.__table__
+    query = filter_select(
+        select([t.c[column] for column in columns]), t, filters, search
+    )
+    if after is not None:
+        query = query.where(t.c.id > after)
+    if sort is not None:
+        order = [t.c[sort]] + [c for c in t.primary_key.columns if c.name != sort]
+        query = query.order_by(*(c.desc() if descending else c for c in order))
+    elif limit is not None:
+        query = query.order_by(t.c.id)
+    if limit is not None:
+        query = query.limit(limit)
+    if offset:
+        query = query.offset(offset)
+    return query
+
+
+def filter_select(query, t: Table, filters: dict = None, search: tuple = None):
+    """
+    Function to add the filters and search of `build_select` to a SELECT
+    :param query: The SELECT
+    :param t: The table being selected from
+    :param filters: Dictionary of column names and values the rows must be equal to
+    :param search: Tuple of a prefix and the names of the columns, one of which must start with it
+    :return: The filtered SELECT
+    """
+    for column, value in (filters or {}).items():
+        query = query.where(t.c[column] == value)
+    if search is not None:
+        prefix, search_columns = search
+        pattern = (
+            prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        )
+        query = query.where(
+            or_(*(t.c[c].like(pattern, escape='\\') for c in search_columns))
+        )
+    return query
+
+
+def count_rows(table: Model, filters: dict = None, search: tuple = None) -> int:
+    """
+    Function to count the rows of a table matching the filters and search of `build_select`
+    :param table: The table whose rows are to be counted
+    :return: The number of rows
+    """
+    t = table.__table__
+    query = filter_select(select([func.count()]).select_from(t), t, filters, search)
+    return db.session.execute(query).scalar()
+
+
+def select_rows(table: Model, columns: List[str], *args, **kwargs) -> list:
+    """
+    Function to get some columns of the rows of a table, without loading them as model objects
+    :param table: The table whose rows are to be retrieved
+    :param columns: Names of the columns to be selected
+    :param args: Filters and pagination, see `build_select`
+    :return: List of tuples, with values in the same order as `columns`
+    """
+    return db.session.execute(build_select(table, columns, *args, **kwargs)).fetchall()
+
+
+def stream_rows(
+    table: Model,
+    columns: List[str],
+    filters: dict = None,
+    search: tuple = None,
+    chunk_size: int = 1000,
+):
+    """
+    Function to read some columns of the rows of a table in chunks, so that the whole table is never held in memory
+
+    Each chunk is a query of its own, for the rows after the last ID of the previous chunk (keyset pagination).
+    Server-side cursors would also do, but mysql-connector ignores `stream_results` and reads the whole result into
+    memory. Rows inserted while the table is being read are included if their ID comes after the current chunk
+    :param table: The table whose rows are to be retrieved
+    :param columns: Names of the columns to be selected
+    :param filters: Dictionary of column names and values the rows must be equal to
+    :param search: Tuple of a prefix and the names of the columns, one of which must start with it
+    :param chunk_size: Number of rows fetched at a time
+    :return: Generator of lists of tuples, with values in the same order as `columns`
+    """
+    # The ID is needed for the next chunk, even if it wasn't asked for
+    selected = columns if 'id' in columns else columns + ['id']
+    id_index = selected.index('id')
+    after = None
+    while True:
+        rows = select_rows(table, selected, filters, after, chunk_size, search=search)
+        if not rows:
+            return
+        after = rows[-1][id_index]
+        yield rows if selected is columns else [tuple(row)[:-1] for row in rows]
+        if len(rows) < chunk_size:
+            return
+
+
 def update_row_in_table(user: Model, column: str, value) -> (bool, str):
     """
     Function to update a single value in a single row in the given table
@@ -78,6 +248,9 @@ def delete_row_from_table(user: Model) -> (bool, str):
     """
 
     db.session.delete(user)
+    release_seats(type(user), [user.id])
+    if isinstance(user, TimestampMixin) and user.created_at is not None:
+        update_rollups(type(user), user.created_at, -1)
     try:
         db.session.commit()
     except IntegrityError as e:
@@ -89,6 +262,473 @@ def delete_row_from_table(user: Model) -> (bool, str):
     return True, ''
 
 
+def chunks(items: list, size: int):
+    """Splits a list into lists of at most `size` items"""
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def insert_rows(table: Model, rows: List[dict]) -> (bool, str):
+    """
+    Function to insert many users into a table with a single executemany, in one transaction which also updates the
+    capacity, rollups, versions, change log and search index of the table
+    :param table: The table users are to be inserted into
+    :param rows: Dictionaries of the values of the users, all with the same keys, including `id`
+    :return: success, and reason if failure (empty on success)
+    """
+    now = datetime.utcnow()
+    if issubclass(table, TimestampMixin):
+        rows = [{**row, 'created_at': now} for row in rows]
+    try:
+        db.session.execute(table.__table__.insert(), rows)
+        # Admins may add registrants beyond the capacity, but the counter has to stay exact
+        claim_seat(table, force=True, count=len(rows))
+        if issubclass(table, TimestampMixin):
+            update_rollups(table, now, len(rows))
+        record_changed_rows(table.__tablename__, [row['id'] for row in rows], 'u', rows)
+        db.session.commit()
+    except (IntegrityError, DataError) as e:
+        db.session.rollback()
+        return False, f'{type(e).__name__} occurred - {e}'
+    return True, ''
+
+
+def update_rows(table: Model, mappings: List[dict]) -> (bool, str):
+    """
+    Function to update many users of a table with bulk update mappings, in one transaction which also updates the
+    versions, change log and search index of the table
+    :param table: The table whose users are to be updated
+    :param mappings: Dictionaries of the `id` of each user and the values to be changed
+    :return: success, and reason if failure (empty on success)
+    """
+    t = table.__table__
+    ids = [mapping['id'] for mapping in mappings]
+    try:
+        db.session.bulk_update_mappings(table, mappings)
+        values = None
+        searched = [c for c in SEARCH_COLUMNS if c in t.c]
+        if any(c in mapping for mapping in mappings for c in searched):
+            # The search index needs all the searchable values of a user, not only the changed ones
+            rows = db.session.execute(
+                select([t.c.id] + [t.c[c] for c in searched]).where(t.c.id.in_(ids))
+            ).fetchall()
+            found = {row[0]: dict(zip(searched, row[1:])) for row in rows}
+            values = [found.get(id_) for id_ in ids]
+        record_changed_rows(table.__tablename__, ids, 'u', values)
+        db.session.commit()
+    except (IntegrityError, DataError) as e:
+        db.session.rollback()
+        return False, f'{type(e).__name__} occurred - {e}'
+    return True, ''
+
+
+def delete_rows(
+    table: Model, ids: list = None, first: int = None, last: int = None
+) -> (int, str):
+    """
+    Function to delete many users from a table at once, with one DELETE per chunk of users, in a single transaction
+    which also updates the capacity, rollups, versions and change log of the table
+    :param table: The table users are to be deleted from
+    :param ids: IDs of the users to be deleted
+    :param first: Lowest ID of the range of users to be deleted, if `ids` isn't given
+    :param last: Highest ID of the range of users to be deleted, if `ids` isn't given
+    :return: number of users deleted, and reason if failure (empty on success)
+    With neither `ids` nor a range, every user is deleted
+    """
+    t = table.__table__
+    columns = [t.c.id]
+    if issubclass(table, TimestampMixin):
+        columns.append(t.c.created_at)
+
+    if ids is not None:
+        rows = []
+        for chunk in chunks(ids, CHUNK_SIZE):
+            rows += db.session.execute(
+                select(columns).where(t.c.id.in_(chunk))
+            ).fetchall()
+    else:
+        query = select(columns)
+        if first is not None:
+            query = query.where(t.c.id >= first)
+        if last is not None:
+            query = query.where(t.c.id <= last)
+        rows = db.session.execute(query).fetchall()
+    if not rows:
+        return 0, ''
+
+    deleted = [row[0] for row in rows]
+    try:
+        for chunk in chunks(deleted, CHUNK_SIZE):
+            db.session.execute(t.delete().where(t.c.id.in_(chunk)))
+        release_seats(table, deleted)
+        if issubclass(table, TimestampMixin):
+            for granularity, get_bucket in ROLLUP_GRANULARITIES.items():
+                buckets = Counter(get_bucket(row[1]) for row in rows if row[1])
+                for bucket, count in buckets.items():
+                    increment(
+                        Rollup.__table__,
+                        {
+                            'event': table.__tablename__,
+                            'granularity': granularity,
+                            'bucket': bucket,
+                        },
+                        'count',
+                        -count,
+                    )
+        record_changed_rows(table.__tablename__, deleted, 'd')
+        db.session.commit()
+    except (IntegrityError, DataError) as e:
+        db.session.rollback()
+        return 0, f'{type(e).__name__} occurred - {e}'
+    return len(deleted), ''
+
+
+def claim_seat(
+    table: Model, force: bool = False, count: int = 1, user_id: int = None
+) -> Union[int, None]:
+    """
+    Function to claim a seat for a new registration, in the current transaction
+
+    The counter row is locked by the UPDATE until the transaction ends, so concurrent registrations are serialised on it
+    and are committed or rolled back along with their insert, keeping the count exact. Registrations beyond the seats
+    are added to the end of the event's waitlist
+    :param table: The table being registered to
+    :param force: Whether to count the registration even if the event and its waitlist are full
+    :param count: Number of registrations, all of which have to fit unless forced
+    :param user_id: ID of the registration, added to the waitlist if it doesn't get a seat
+    :return: Position on the waitlist (of the last registration), 0 if the registration got a seat or the event has no
+    limit, None if the event and its waitlist are full
+    """
+    name = table.__tablename__
+    statement = (
+        update(Capacity.__table__)
+        .where(Capacity.event == name)
+        .values(registered=Capacity.registered + count)
+    )
+    if not force:
+        statement = statement.where(
+            Capacity.registered + count <= Capacity.seats + Capacity.waitlist
+        )
+    if db.session.execute(statement).rowcount == 0:
+        if db.session.query(Capacity.event).filter(Capacity.event == name).first():
+            return None
+        return 0
+    registered, seats = (
+        db.session.query(Capacity.registered, Capacity.seats)
+        .filter(Capacity.event == name)
+        .one()
+    )
+    # Registrations which are counted but not waiting have a seat, including any added past the seats with `force`
+    waiting = count_waiting(name)
+    if registered - waiting <= seats:
+        return 0
+    if user_id is not None:
+        db.session.execute(
+            Waitlist.__table__.insert().values(event=name, user_id=user_id)
+        )
+    return waiting + count
+
+
+def count_waiting(event: str) -> int:
+    """Returns the number of registrants on the waitlist of an event"""
+    t = Waitlist.__table__
+    return db.session.execute(
+        select([func.count()]).select_from(t).where(t.c.event == event)
+    ).scalar()
+
+
+def release_seats(table: Model, ids: List[int]) -> List[int]:
+    """
+    Function to give the seats of deleted registrations back to an event, in the current transaction, and move as many
+    registrants up from the waitlist as there are seats free
+
+    The counter is clamped at zero, so deleting more registrations than were counted (for example ones made before
+    the limit was set) can't leave it negative. The IDs moved up are also added to `db.session.info['promoted']`,
+    so that they can be announced once the transaction is committed (see `utils.log_promotions`)
+    :param table: The table registrations have been deleted from
+    :param ids: IDs of the deleted registrations, empty to only fill seats which have been added
+    :return: IDs of the registrants moved up from the waitlist, in the order they registered
+    """
+    name = table.__tablename__
+    count = len(ids)
+    if not db.session.execute(
+        update(Capacity.__table__)
+        .where(Capacity.event == name)
+        .values(
+            registered=case(
+                [(Capacity.registered > count, Capacity.registered - count)], else_=0
+            )
+        )
+    ).rowcount:
+        return []
+
+    t = Waitlist.__table__
+    for chunk in chunks(ids, CHUNK_SIZE):
+        db.session.execute(
+            t.delete().where(t.c.event == name).where(t.c.user_id.in_(chunk))
+        )
+    registered, seats = (
+        db.session.query(Capacity.registered, Capacity.seats)
+        .filter(Capacity.event == name)
+        .one()
+    )
+    free = seats - (registered - count_waiting(name))
+    if free <= 0:
+        return []
+    promoted = [
+        user_id
+        for (user_id,) in db.session.execute(
+            select([t.c.user_id]).where(t.c.event == name).order_by(t.c.seq).limit(free)
+        )
+    ]
+    if promoted:
+        db.session.execute(
+            t.delete().where(t.c.event == name).where(t.c.user_id.in_(promoted))
+        )
+        db.session.info.setdefault('promoted', {}).setdefault(name, []).extend(promoted)
+    return promoted
+
+
+def increment(table: Table, keys: dict, column: str, amount: int = 1, **values):
+    """
+    Function to add to a counter column in the row with the given keys, creating the row if required, in the current
+    transaction
+
+    MySQL and PostgreSQL do this in one atomic upsert, other databases try an UPDATE followed by an INSERT
+    :param table: The table holding the counter
+    :param keys: Values of the primary key columns of the row
+    :param column: Name of the counter column
+    :param amount: Value to be added to it
+    :param values: Other columns to be set in the row
+    """
+    dialect = db.session.get_bind().dialect.name
+    changes = dict(values, **{column: table.c[column] + amount})
+    row = dict(keys, **values, **{column: amount})
+    if dialect == 'mysql':
+        statement = mysql_insert(table).values(**row)
+        statement = statement.on_duplicate_key_update(**changes)
+    elif dialect == 'postgresql':
+        statement = postgresql_insert(table).values(**row)
+        statement = statement.on_conflict_do_update(
+            index_elements=list(keys), set_=changes
+        )
+    else:
+        where = and_(*(table.c[k] == v for k, v in keys.items()))
+        statement = update(table).where(where).values(**changes)
+        if db.session.execute(statement).rowcount:
+            return
+        statement = sql_insert(table).values(**row)
+    db.session.execute(statement)
+
+
+def insert_ignore(table: Table, rows: List[dict]):
+    """
+    Function to insert many rows, in chunks of `BULK_CHUNK_SIZE` with one statement each, in the current transaction,
+    skipping the rows whose keys already exist
+
+    MySQL uses INSERT IGNORE, PostgreSQL ON CONFLICT DO NOTHING and SQLite INSERT OR IGNORE
+    :param table: The table
+    :param rows: Dictionaries of the values of the rows, all with the same keys
+    """
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        statement = mysql_insert(table).prefix_with('IGNORE')
+    elif dialect == 'postgresql':
+        statement = postgresql_insert(table).on_conflict_do_nothing()
+    else:
+        statement = sql_insert(table).prefix_with('OR IGNORE')
+    for chunk in chunks(rows, CHUNK_SIZE):
+        db.session.execute(statement, chunk)
+    db.session.info.setdefault('changed_tables', set()).add(table.name)
+
+
+def update_rollups(table: Model, at: datetime, amount: int):
+    """
+    Function to update the hourly and daily registration rollups of an event, in the current transaction
+    :param table: The event's table
+    :param at: Creation time of the registration
+    :param amount: 1 for an insert, -1 for a delete
+    """
+    for granularity, get_bucket in ROLLUP_GRANULARITIES.items():
+        increment(
+            Rollup.__table__,
+            {
+                'event': table.__tablename__,
+                'granularity': granularity,
+                'bucket': get_bucket(at),
+            },
+            'count',
+            amount,
+        )
+
+
+def bump_versions(table_names: set):
+    """
+    Function to bump the versions of the given tables, in the current transaction
+    :param table_names: Names of the tables that have been changed
+    """
+    now = datetime.utcnow()
+    for name in sorted(table_names):
+        increment(TableVersion.__table__, {'name': name}, 'version', modified=now)
+
+
+def get_versions(table_names: list = None) -> dict:
+    """
+    Function to get the versions of tables, with a single query
+    :param table_names: Names of the tables, all tables if None
+    :return: Dictionary mapping table names to (version, modified), tables which never changed are left out
+    """
+    query = db.session.query(
+        TableVersion.name, TableVersion.version, TableVersion.modified
+    )
+    if table_names is not None:
+        query = query.filter(TableVersion.name.in_(table_names))
+    return {name: (version, modified) for name, version, modified in query}
+
+
+@event.listens_for(db.session, 'after_flush')
+def record_changed_tables(session, flush_context):
+    """
+    Remembers which tables the objects inserted, updated or deleted in a flush belong to, and which registrants were
+    changed
+    """
+    changed = session.info.setdefault('changed_tables', set())
+    rows = session.info.setdefault('changed_rows', [])
+    for obj in session.new:
+        changed.add(obj.__tablename__)
+        if is_registrant(obj):
+            rows.append((obj.__tablename__, obj.id, 'u'))
+    for obj in session.dirty:
+        if session.is_modified(obj):
+            changed.add(obj.__tablename__)
+            if is_registrant(obj):
+                rows.append((obj.__tablename__, obj.id, 'u'))
+    for obj in session.deleted:
+        changed.add(obj.__tablename__)
+        if is_registrant(obj):
+            rows.append((obj.__tablename__, obj.id, 'd'))
+
+
+def is_registrant(obj) -> bool:
+    """
+    Returns whether an object is a row of an event's table, whose changes are written to the change log
+
+    These are the tables with an `id`, whether or not they record when users registered (`TimestampMixin`)
+    """
+    return 'id' in obj.__table__.c
+
+
+def record_changed_rows(table_name: str, ids: list, op: str, values: list = None):
+    """
+    Function to add registrants changed without the ORM to the change log, the version of their table and the search
+    index, when the current transaction is committed
+    :param table_name: Name of the table
+    :param ids: IDs of the registrants
+    :param op: `u` if they were inserted or updated, `d` if they were deleted
+    :param values: Dictionaries of the values of the registrants inserted or updated, in the same order as `ids`
+    """
+    info = db.session.info
+    info.setdefault('changed_tables', set()).add(table_name)
+    info.setdefault('changed_rows', []).extend((table_name, id_, op) for id_ in ids)
+    if op == 'd':
+        values = [None] * len(ids)
+    if values is not None:
+        info.setdefault('search_changes', {}).update(
+            ((table_name, id_), v) for id_, v in zip(ids, values)
+        )
+
+
+def log_changes(session, rows: list):
+    """
+    Function to write changed registrants to the change log, in the current transaction
+    :param session: The session
+    :param rows: List of (table name, ID, operation) tuples, in the order the changes were made
+    """
+    now = datetime.utcnow()
+    t = Change.__table__
+    session.execute(
+        t.insert(),
+        [
+            {'event': event, 'user_id': user_id, 'op': op, 'at': now}
+            for event, user_id, op in rows
+        ],
+    )
+    if random() < 0.01:
+        purge_changes(session, now - timedelta(days=CHANGE_RETENTION_DAYS))
+
+
+def purge_changes(session, before: datetime):
+    """
+    Function to delete the entries of the change log older than the given time, in the current transaction, keeping
+    the last one deleted for each table in `change_purges`
+    :param session: The session
+    :param before: Entries from before this time are deleted
+    """
+    t = Change.__table__
+    purged = session.execute(
+        select([t.c.event, func.max(t.c.seq)])
+        .where(t.c.at < before)
+        .group_by(t.c.event)
+        .order_by(t.c.event)
+    ).fetchall()
+    if not purged:
+        return
+    p = ChangePurge.__table__
+    dialect = session.get_bind().dialect.name
+    for event, seq in purged:
+        # Purges running at once may finish in any order, the watermark must only move forward
+        latest = case([(p.c.seq > seq, p.c.seq)], else_=seq)
+        if dialect == 'mysql':
+            statement = mysql_insert(p).values(event=event, seq=seq)
+            statement = statement.on_duplicate_key_update(seq=latest)
+        elif dialect == 'postgresql':
+            statement = postgresql_insert(p).values(event=event, seq=seq)
+            statement = statement.on_conflict_do_update(
+                index_elements=['event'], set_={'seq': latest}
+            )
+        else:
+            statement = update(p).where(p.c.event == event).values(seq=latest)
+            if session.execute(statement).rowcount:
+                continue
+            statement = p.insert().values(event=event, seq=seq)
+        session.execute(statement)
+    session.execute(t.delete().where(t.c.at < before))
+
+
+@event.listens_for(db.session, 'before_commit')
+def bump_changed_versions(session):
+    """
+    Bumps the versions of all tables changed in a transaction, just before it is committed
+
+    Writes made without the ORM should add the names of the tables they change to `session.info['changed_tables']`,
+    or call `record_changed_rows()` for registrants
+    """
+    session.flush()
+    changed = session.info.pop('changed_tables', None)
+    rows = session.info.pop('changed_rows', None)
+    if changed:
+        bump_versions(changed)
+        # Read by the caches once the transaction is committed
+        session.info['committed_tables'] = changed
+        # Read by `stream.publish()`, to number the changes it announces in the order they were committed
+        session.info['committed_versions'] = {
+            name: version for name, (version, _) in get_versions(changed).items()
+        }
+    # Written after the versions, whose rows stay locked until the commit, so that the changes of a table are numbered
+    # in the order they are committed
+    if rows:
+        log_changes(session, rows)
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def forget_changed_tables(session, previous_transaction):
+    session.info.pop('changed_tables', None)
+    session.info.pop('changed_rows', None)
+    session.info.pop('committed_tables', None)
+    session.info.pop('committed_versions', None)
+    session.info.pop('promoted', None)
+
+
 def commit_transaction() -> (bool, str):
     """
     Function to commit the current changes in the database
@@ -0,0 +1,314 @@
+"""
+Background export jobs
+
+An export writes one or more tables into a zip archive, holding a gzipped CSV per table and a `manifest.json`. It runs
+in a separate process, reading the tables from the database in chunks, so that long exports neither tie up a web worker
+nor run into gunicorn's timeout. Jobs are tracked in a shared SQLite database, so any worker can report on them.
+
+At most `EXPORT_CONCURRENCY` exports are queued or running at once across the host. A running export records its pid
+and a heartbeat with every chunk, and is marked as failed once its process is gone or its heartbeat stops. Archives are
+deleted `EXPORT_RETENTION_HOURS` after they are finished, as they hold the details of registrants.
+"""
+
+import csv
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import time
+import zipfile
+from uuid import uuid4
+
+from decouple import config
+from flask import jsonify, request, send_file, url_for
+from flask_login import current_user, login_required
+
+from . import app, db
+from .admission import RETRY_AFTER
+from .db_utils import stream_rows
+from .shared import STATE_DIR, connect, make_private_dir
+from .utils import (
+    INTERNAL_TABLES,
+    check_access,
+    get_registration_counts,
+    get_table_by_name,
+    log,
+)
+
+# Directory where finished exports are stored
+EXPORT_DIR = config('EXPORT_DIR', default=os.path.join(STATE_DIR, 'exports'))
+
+JOBS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS exports (
+    id TEXT PRIMARY KEY,
+    user TEXT NOT NULL,
+    tables TEXT NOT NULL,
+    status TEXT NOT NULL,
+    rows INTEGER NOT NULL DEFAULT 0,
+    total INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    pid INTEGER,
+    heartbeat REAL NOT NULL,
+    created REAL NOT NULL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS exports_status ON exports (status);
+'''
+
+# Number of rows read from the database at a time
+CHUNK_SIZE = 5000
+
+# Number of exports which may be queued or running at once, each in a process of its own
+EXPORT_CONCURRENCY = config('EXPORT_CONCURRENCY', default=2, cast=int)
+
+# Seconds without a heartbeat after which a running export is considered dead
+HEARTBEAT_TIMEOUT = config('EXPORT_HEARTBEAT_TIMEOUT', default=120, cast=float)
+
+# Hours for which finished exports can be downloaded, before they are deleted
+RETENTION_HOURS = config('EXPORT_RETENTION_HOURS', default=24, cast=float)
+
+
+def update_job(job_id: str, **values):
+    """Updates the given columns of an export job, along with its heartbeat"""
+    values['heartbeat'] = time.time()
+    columns = ', '.join(f'{k} = ?' for k in values)
+    connect(JOBS_SCHEMA).execute(
+        f'UPDATE exports SET {columns} WHERE id = ?',
+        (*values.values(), job_id),
+    )
+
+
+def get_job(job_id: str):
+    """Returns an export job as a dictionary, None if it doesn't exist"""
+    conn = connect(JOBS_SCHEMA)
+    cursor = conn.execute('SELECT * FROM exports WHERE id = ?', (job_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip((c[0] for c in cursor.description), row))
+
+
+def is_alive(pid: int) -> bool:
+    """Returns whether a process is still running"""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def reap_jobs():
+    """Marks exports whose process died as failed, and deletes the archives of exports past the retention period"""
+    now = time.time()
+    conn = connect(JOBS_SCHEMA)
+    for job_id, pid, heartbeat in conn.execute(
+        "SELECT id, pid, heartbeat FROM exports WHERE status IN ('queued', 'running')"
+    ).fetchall():
+        if heartbeat < now - HEARTBEAT_TIMEOUT or (pid and not is_alive(pid)):
+            conn.execute(
+                "UPDATE exports SET status = 'failed', error = ?, finished = ? "
+                "WHERE id = ? AND status IN ('queued', 'running')",
+                ('The export stopped unexpectedly', now, job_id),
+            )
+
+    cutoff = now - RETENTION_HOURS * 3600
+    conn.execute(
+        "UPDATE exports SET status = 'expired' WHERE status = 'done' AND finished < ?",
+        (cutoff,),
+    )
+    if not os.path.isdir(EXPORT_DIR):
+        return
+    # Archives are deleted by age rather than by job, which also catches those left behind by crashed exports
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def get_export_path(job_id: str) -> str:
+    """Returns the path where the archive of an export job is stored"""
+    return os.path.join(EXPORT_DIR, f'{job_id}.zip')
+
+
+def write_table(
+    archive: zipfile.ZipFile, table_name: str, job_id: str, done: int
+) -> dict:
+    """
+    Function to write a table into an export archive as a gzipped CSV
+    :param archive: The archive being written
+    :param table_name: Name of the table
+    :param job_id: ID of the export job, whose progress is updated after every chunk
+    :param done: Number of rows already exported from earlier tables
+    :return: Entry of the table in the manifest
+    """
+    table = get_table_by_name(table_name)
+    columns = list(table.__table__.columns.keys())
+    file_name = f'{table_name}.csv.gz'
+    rows = 0
+    # The CSV is already compressed, so it is stored in the archive as is
+    with archive.open(file_name, 'w') as entry:
+        with gzip.GzipFile(fileobj=entry, mode='wb') as compressed:
+            with io.TextIOWrapper(compressed, encoding='utf-8', newline='') as text:
+                writer = csv.writer(text)
+                writer.writerow(columns)
+                for chunk in stream_rows(table, columns, chunk_size=CHUNK_SIZE):
+                    writer.writerows(chunk)
+                    rows += len(chunk)
+                    update_job(job_id, rows=done + rows)
+    return {'table': table_name, 'file': file_name, 'columns': columns, 'rows': rows}
+
+
+def run_export(job_id: str):
+    """
+    Function which runs an export job, in a process of its own
+    :param job_id: ID of the export job
+    """
+    job = get_job(job_id)
+    tables = json.loads(job['tables'])
+    path = get_export_path(job_id)
+    partial = f'{path}.partial'
+    make_private_dir(EXPORT_DIR)
+
+    with app.app_context():
+        try:
+            update_job(
+                job_id,
+                status='running',
+                pid=os.getpid(),
+                total=sum(get_registration_counts(tables).values()),
+            )
+            manifest = {
+                'id': job_id,
+                'user': job['user'],
+                'created': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'tables': [],
+            }
+            done = 0
+            with zipfile.ZipFile(partial, 'w', zipfile.ZIP_STORED) as archive:
+                for table_name in tables:
+                    entry = write_table(archive, table_name, job_id, done)
+                    done += entry['rows']
+                    manifest['tables'].append(entry)
+                archive.writestr('manifest.json', json.dumps(manifest, indent=4))
+            os.replace(partial, path)
+        except Exception as e:
+            update_job(job_id, status='failed', error=str(e), finished=time.time())
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        finally:
+            db.session.remove()
+    update_job(job_id, status='done', rows=done, finished=time.time())
+
+
+def job_to_json(job: dict) -> dict:
+    """Returns the status of an export job as shown to the user"""
+    ret = {
+        'id': job['id'],
+        'tables': json.loads(job['tables']),
+        'status': job['status'],
+        'rows': job['rows'],
+        'total': job['total'],
+        'progress': round(job['rows'] / job['total'], 4) if job['total'] else 0,
+    }
+    if job['status'] == 'done':
+        ret['progress'] = 1
+        ret['download'] = url_for('download_export', job_id=job['id'], _external=True)
+    if job['error']:
+        ret['error'] = job['error']
+    return ret
+
+
+@app.route('/api/exports', methods=['POST'])
+@login_required
+def create_export():
+    """
+    Starts an export of the given tables in the background
+
+    -> tables - Comma separated names of the tables to be exported
+    """
+    if not request.form.get('tables'):
+        return jsonify({'message': 'Please provide all required data'}), 400
+    tables = request.form['tables'].split(',')
+    for table_name in tables:
+        if table_name in INTERNAL_TABLES or get_table_by_name(table_name) is None:
+            return jsonify({'message': f'Table {table_name} does not exist!'}), 400
+        if not check_access(table_name):
+            return jsonify({'message': 'Unauthorized'}), 401
+
+    reap_jobs()
+    job_id = uuid4().hex
+    now = time.time()
+    # Counting the exports and adding the new one in one statement keeps the limit across workers
+    added = (
+        connect(JOBS_SCHEMA)
+        .execute(
+            'INSERT INTO exports (id, user, tables, status, heartbeat, created) '
+            "SELECT ?, ?, ?, 'queued', ?, ? WHERE "
+            "(SELECT count(*) FROM exports WHERE status IN ('queued', 'running')) < ?",
+            (
+                job_id,
+                current_user.username,
+                json.dumps(tables),
+                now,
+                now,
+                EXPORT_CONCURRENCY,
+            ),
+        )
+        .rowcount
+    )
+    if not added:
+        return (
+            jsonify(
+                {'message': 'Too many exports are running, please try again later'}
+            ),
+            503,
+            {'Retry-After': str(RETRY_AFTER)},
+        )
+
+    # Reap exports which have finished, and start the new one in a fresh interpreter rather than a fork of this
+    # (threaded) worker
+    multiprocessing.active_children()
+    process = multiprocessing.get_context('spawn').Process(
+        target=run_export, args=(job_id,), daemon=False
+    )
+    process.start()
+    update_job(job_id, pid=process.pid)
+
+    log(f'<code>{current_user.name}</code> is exporting {", ".join(tables)}!')
+    return jsonify(job_to_json(get_job(job_id))), 202
+
+
+@app.route('/api/exports/<string:job_id>')
+@login_required
+def export_status(job_id: str):
+    """Returns the status and progress of an export, along with the URL to download it once it is done"""
+    reap_jobs()
+    job = get_job(job_id)
+    if job is None or job['user'] != current_user.username:
+        return jsonify({'message': f'No export with ID {job_id}'}), 404
+    return jsonify(job_to_json(job)), 200
+
+
+@app.route('/api/exports/<string:job_id>/download')
+@login_required
+def download_export(job_id: str):
+    """Downloads the archive of a finished export"""
+    job = get_job(job_id)
+    if job is None or job['user'] != current_user.username:
+        return jsonify({'message': f'No export with ID {job_id}'}), 404
+    if job['status'] != 'done':
+        return jsonify({'message': f'Export {job_id} is {job["status"]}'}), 409
+    log(f'<code>{current_user.name}</code> is downloading export {job_id}!')
+    return send_file(
+        get_export_path(job_id),
+        mimetype='application/zip',
+        as_attachment=True,
+        attachment_filename=f'hades-export-{job_id}.zip',
+    )
@@ -0,0 +1,60 @@
+"""
+HTTP conditional requests for the read APIs
+
+Responses get a strong ETag derived from the versions of the tables they are built from (see
+`db_utils.bump_versions`), along with the user and the request's query string, and a Last-Modified from the latest
+change to those tables. A request whose If-None-Match still matches gets a 304 after a single query for the versions,
+without running the endpoint at all. ETags are compared weakly, as they are weakened when a response is compressed.
+
+If-Modified-Since is ignored: Last-Modified only has whole seconds, so a change made in the same second as a response
+would not make it stale.
+"""
+
+from functools import wraps
+from hashlib import sha1
+
+from flask import make_response, request
+from flask_login import current_user
+
+from .db_utils import ACCESS_TABLES, get_versions
+
+
+def conditional(get_tables=None):
+    """
+    Decorator making an endpoint answer conditional requests
+    :param get_tables: Function returning the names of the tables the response is built from, or None for all
+    tables. The access tables are always included.
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            tables = None if get_tables is None else get_tables()
+            if tables is not None:
+                tables = sorted(set(tables) | set(ACCESS_TABLES))
+            versions = get_versions(tables)
+
+            key = f'{current_user.get_id()}|{request.full_path}|' + '|'.join(
+                f'{name}:{version}' for name, (version, _) in sorted(versions.items())
+            )
+            etag = sha1(key.encode()).hexdigest()
+            modified = [m for _, m in versions.values() if m is not None]
+            last_modified = max(modified).replace(microsecond=0) if modified else None
+
+            if request.if_none_match.contains_weak(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            if last_modified is not None:
+                response.last_modified = last_modified
+            # Clients may keep the response, but have to check whether it is still valid every time
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+
+        return wrapper
+
+    return decorator
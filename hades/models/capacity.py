@@ -0,0 +1,20 @@
+from hades import db
+
+
+class Capacity(db.Model):
+    """
+    Database model class
+
+    Holds the seat limit of an event, along with a counter of its registrations which is
+    updated in the same transaction as every insert into and delete from the event's table
+    """
+
+    __tablename__ = 'capacity'
+
+    event = db.Column(db.String(50), db.ForeignKey('events.name'), primary_key=True)
+    seats = db.Column(db.Integer, nullable=False)
+    waitlist = db.Column(db.Integer, nullable=False, default=0)
+    registered = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return '%r' % [self.event, self.seats, self.waitlist, self.registered]
@@ -0,0 +1,22 @@
+from hades import db
+
+
+class Change(db.Model):
+    """
+    Database model class
+
+    Holds one entry per registrant inserted, updated (`u`) or deleted (`d`), written in the same transaction as the
+    change itself, so that clients can fetch only what changed since they last synced
+    """
+
+    __tablename__ = 'changes'
+    __table_args__ = (db.Index('changes_event_seq', 'event', 'seq'),)
+
+    seq = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    event = db.Column(db.String(50), nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(1), nullable=False)
+    at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return '%r' % [self.seq, self.event, self.user_id, self.op, self.at]
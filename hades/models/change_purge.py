@@ -0,0 +1,18 @@
+from hades import db
+
+
+class ChangePurge(db.Model):
+    """
+    Database model class
+
+    Holds, for every table, the last entry of the change log which was deleted as too old, so that a cursor is only
+    expired by the loss of changes to its own table
+    """
+
+    __tablename__ = 'change_purges'
+
+    event = db.Column(db.String(50), primary_key=True)
+    seq = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return '%r' % [self.event, self.seq]
@@ -2,17 +2,18 @@ from hades import db
 
 from requests import get
 
+from hades.models.timestamp import TimestampMixin
 from hades.models.validate import ValidateMixin
 
 
-class CodexApril2019(ValidateMixin, db.Model):
+class CodexApril2019(TimestampMixin, ValidateMixin, db.Model):
     """
     Database model class
     """
 
     __tablename__ = 'codex_april_2019'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(30))
+    name = db.Column(db.String(30), index=True)
     email = db.Column(db.String(50), unique=True)
     phone = db.Column(db.String(21), unique=True)
     department = db.Column(db.String(50))
@@ -21,14 +22,14 @@ class CodexApril2019(ValidateMixin, db.Model):
         return '%r' % [self.id, self.name, self.email, self.phone, self.department]
 
 
-class RSC2019(ValidateMixin, db.Model):
+class RSC2019(TimestampMixin, ValidateMixin, db.Model):
     """
     Database model class
     """
 
     __tablename__ = 'rsc_2019'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(30))
+    name = db.Column(db.String(30), index=True)
     email = db.Column(db.String(50), unique=True)
     phone = db.Column(db.String(21), unique=True)
     department = db.Column(db.String(50))
@@ -45,14 +46,14 @@ class RSC2019(ValidateMixin, db.Model):
         ]
 
 
-class CodexDecember2019(ValidateMixin, db.Model):
+class CodexDecember2019(TimestampMixin, ValidateMixin, db.Model):
     """
     Database model class
     """
 
     __tablename__ = 'codex_december_2019'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(62))
+    name = db.Column(db.String(62), index=True)
     email = db.Column(db.String(102), unique=True)
     phone = db.Column(db.String(21), unique=True)
     department = db.Column(db.String(20))
@@ -88,14 +89,14 @@ class CodexDecember2019(ValidateMixin, db.Model):
         return super().validate()
 
 
-class BOV2020(ValidateMixin, db.Model):
+class BOV2020(TimestampMixin, ValidateMixin, db.Model):
     """
     Database model class
     """
 
     __tablename__ = 'bov_2020'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(31))
+    name = db.Column(db.String(31), index=True)
     email = db.Column(db.String(51), unique=True)
     phone = db.Column(db.String(19))
     hackerrank_username = db.Column(db.String(50), unique=True)
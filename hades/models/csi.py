@@ -1,15 +1,16 @@
 from hades import db
+from hades.models.timestamp import TimestampMixin
 from hades.models.validate import ValidateMixin
 
 
-class CSINovember2019(ValidateMixin, db.Model):
+class CSINovember2019(TimestampMixin, ValidateMixin, db.Model):
     """
     Database model class
     """
 
     __tablename__ = 'csi_november_2019'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(30))
+    name = db.Column(db.String(30), index=True)
     email = db.Column(db.String(50), unique=True)
     phone = db.Column(db.String(21), unique=True)
     department = db.Column(db.String(50))
@@ -33,14 +34,14 @@ class CSINovember2019(ValidateMixin, db.Model):
         return super().validate()
 
 
-class CSINovemberNonMember2019(ValidateMixin, db.Model):
+class CSINovemberNonMember2019(TimestampMixin, ValidateMixin, db.Model):
     """
     Database model class
     """
 
     __tablename__ = 'csi_november_non_member_2019'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(30))
+    name = db.Column(db.String(30), index=True)
     email = db.Column(db.String(50), unique=True)
     phone = db.Column(db.String(21), unique=True)
     department = db.Column(db.String(50))
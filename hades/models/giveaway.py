@@ -1,15 +1,16 @@
 from hades import db
+from hades.models.timestamp import TimestampMixin
 from hades.models.validate import ValidateMixin
 
 
-class Coursera2020(ValidateMixin, db.Model):
+class Coursera2020(TimestampMixin, ValidateMixin, db.Model):
     """
     Database model class
     """
 
     __tablename__ = 'coursera_2020'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(30))
+    name = db.Column(db.String(30), index=True)
     email = db.Column(db.String(50), unique=True)
     phone = db.Column(db.String(10), unique=True)
     prn = db.Column(db.String(10), unique=True)
@@ -0,0 +1,18 @@
+from hades import db
+
+
+class Group(db.Model):
+    """
+    Database model class
+
+    A role which users are members of, granting access to the events listed for it in `group_access`, or to every
+    event, including ones added later, if `all_events` is set
+    """
+
+    __tablename__ = 'groups'
+
+    name = db.Column(db.String(50), primary_key=True)
+    all_events = db.Column(db.Boolean, nullable=False, default=False)
+
+    def __repr__(self):
+        return '%r' % [self.name, self.all_events]
@@ -0,0 +1,19 @@
+from hades import db
+
+
+class GroupAccess(db.Model):
+    """
+    Database model class
+    """
+
+    __tablename__ = 'group_access'
+
+    group = db.Column(
+        db.String(50), db.ForeignKey('groups.name'), nullable=False, primary_key=True
+    )
+    event = db.Column(
+        db.String(50), db.ForeignKey('events.name'), nullable=False, primary_key=True
+    )
+
+    def __repr__(self):
+        return '%r' % [self.group, self.event]
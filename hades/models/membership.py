@@ -0,0 +1,20 @@
+from hades import db
+
+
+class Membership(db.Model):
+    """
+    Database model class
+    """
+
+    __tablename__ = 'memberships'
+    __table_args__ = (db.Index('memberships_user', 'user'),)
+
+    group = db.Column(
+        db.String(50), db.ForeignKey('groups.name'), nullable=False, primary_key=True
+    )
+    user = db.Column(
+        db.String(20), db.ForeignKey('users.username'), nullable=False, primary_key=True
+    )
+
+    def __repr__(self):
+        return '%r' % [self.group, self.user]
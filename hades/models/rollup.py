@@ -0,0 +1,20 @@
+from hades import db
+
+
+class Rollup(db.Model):
+    """
+    Database model class
+
+    Holds the number of registrations an event received in one hour or one day, updated in the same transaction as
+    every insert into and delete from the event's table
+    """
+
+    __tablename__ = 'rollups'
+
+    event = db.Column(db.String(50), primary_key=True)
+    granularity = db.Column(db.String(4), primary_key=True)
+    bucket = db.Column(db.DateTime, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return '%r' % [self.event, self.granularity, self.bucket, self.count]
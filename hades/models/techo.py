@@ -1,15 +1,16 @@
 from hades import db
+from hades.models.timestamp import TimestampMixin
 from hades.models.validate import ValidateMixin
 
 
-class EHJuly2019(ValidateMixin, db.Model):
+class EHJuly2019(TimestampMixin, ValidateMixin, db.Model):
     """
     Database model class
     """
 
     __tablename__ = 'eh_july_2019'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(30))
+    name = db.Column(db.String(30), index=True)
     email = db.Column(db.String(50), unique=True)
     phone = db.Column(db.String(21), unique=True)
     department = db.Column(db.String(50))
@@ -18,14 +19,14 @@ class EHJuly2019(ValidateMixin, db.Model):
         return '%r' % [self.id, self.name, self.email, self.phone, self.department]
 
 
-class P5November2019(ValidateMixin, db.Model):
+class P5November2019(TimestampMixin, ValidateMixin, db.Model):
     """
     Database model class
     """
 
     __tablename__ = 'p5_november_2019'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(30))
+    name = db.Column(db.String(30), index=True)
     email = db.Column(db.String(50), unique=True)
     phone = db.Column(db.String(21), unique=True)
     department = db.Column(db.String(50))
@@ -1,14 +1,15 @@
 from hades import db
+from hades.models.timestamp import TimestampMixin
 
 
-class TestTable(db.Model):
+class TestTable(TimestampMixin, db.Model):
     """
     Database model class
     """
 
     __tablename__ = 'test_users'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(30))
+    name = db.Column(db.String(30), index=True)
     email = db.Column(db.String(50), unique=True)
     phone = db.Column(db.String(21), unique=True)
 
@@ -0,0 +1,14 @@
+from datetime import datetime
+
+from sqlalchemy.ext.declarative import declared_attr
+
+from hades import db
+
+
+class TimestampMixin(object):
+    """Mixin for event tables, recording when each registration was created (in UTC)"""
+
+    @declared_attr
+    def created_at(cls):
+        # Declared lazily, so that it is placed after the columns of the table itself
+        return db.Column(db.DateTime, default=datetime.utcnow, index=True)
@@ -51,7 +51,7 @@ class TSG(db.Model):
 
     __tablename__ = 'tsg'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(30))
+    name = db.Column(db.String(30), index=True)
     email = db.Column(db.String(50), unique=True)
     phone = db.Column(db.String(10), unique=True)
 
@@ -2,6 +2,32 @@ from typing import Union
 
 from hades import db
 
+# Phone numbers shorter than this are rejected
+MIN_PHONE_LENGTH = 10
+
+
+def split_phones(value) -> list:
+    """Returns the phone numbers of a registration, several of which may be given separated with |"""
+    return str(value).split('|')
+
+
+def get_phone_keys(value) -> set:
+    """
+    Function to get every number a new registration may not contain, given the phone numbers of an existing one
+
+    A number is taken if it appears anywhere within the phone numbers of another registration, for example 9876543210
+    within +919876543210. These are all the runs of `MIN_PHONE_LENGTH` or more characters of each number, so imports
+    can apply the same rule as `ValidateMixin.validate` with a set lookup instead of a query per number
+    :param value: The phone column of the existing registration
+    :return: Set of the numbers which are taken
+    """
+    keys = set()
+    for num in split_phones(value):
+        for start in range(len(num) - MIN_PHONE_LENGTH + 1):
+            for end in range(start + MIN_PHONE_LENGTH, len(num) + 1):
+                keys.add(num[start:end])
+    return keys
+
 
 class ValidateMixin(object):
     def validate(self) -> Union[str, bool]:
@@ -10,11 +36,12 @@ class ValidateMixin(object):
         if self.query.filter(table.email == self.email).first():
             return f'Email address {self.email} already found in database! Please re-enter the form correctly!'
 
-        # Ensure nobody else in the table has the same phone number
-        for num in self.phone.split('|'):
-            if len(str(num)) < 10:
+        # Ensure nobody else in the table has the same phone number (see `get_phone_keys`)
+        for num in split_phones(self.phone):
+            if len(num) < MIN_PHONE_LENGTH:
                 return f'Phone number {num} is too short! Please re-enter the form correctly!'
-            if self.query.filter(table.phone.like(f'%{num}%')).first():
+            pattern = num.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            if self.query.filter(table.phone.like(f'%{pattern}%', escape='\\')).first():
                 return f'Phone number {num} already found in database! Please re-enter the form correctly!'
 
         return True
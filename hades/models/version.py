@@ -0,0 +1,18 @@
+from hades import db
+
+
+class TableVersion(db.Model):
+    """
+    Database model class
+
+    Holds a version number for every table, bumped in the same transaction as every insert, update and delete
+    """
+
+    __tablename__ = 'table_versions'
+
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    modified = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return '%r' % [self.name, self.version, self.modified]
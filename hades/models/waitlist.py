@@ -0,0 +1,20 @@
+from hades import db
+
+
+class Waitlist(db.Model):
+    """
+    Database model class
+
+    Holds the registrants of an event who are waiting for a seat, in the order they registered. Rows are added and
+    removed in the same transaction as the registrations, along with the counter in `capacity`
+    """
+
+    __tablename__ = 'waitlist'
+    __table_args__ = (db.Index('waitlist_event_seq', 'event', 'seq'),)
+
+    seq = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    event = db.Column(db.String(50), db.ForeignKey('events.name'), nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+
+    def __repr__(self):
+        return '%r' % [self.seq, self.event, self.user_id]
@@ -1,15 +1,16 @@
 from hades import db
+from hades.models.timestamp import TimestampMixin
 from hades.models.validate import ValidateMixin
 
 
-class CPPWSMay2019(ValidateMixin, db.Model):
+class CPPWSMay2019(TimestampMixin, ValidateMixin, db.Model):
     """
     Database model class
     """
 
     __tablename__ = 'cpp_workshop_may_2019'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(30))
+    name = db.Column(db.String(30), index=True)
     email = db.Column(db.String(50), unique=True)
     phone = db.Column(db.String(21), unique=True)
 
@@ -17,14 +18,14 @@ class CPPWSMay2019(ValidateMixin, db.Model):
         return '%r' % [self.id, self.name, self.email, self.phone]
 
 
-class CCPPWSAugust2019(ValidateMixin, db.Model):
+class CCPPWSAugust2019(TimestampMixin, ValidateMixin, db.Model):
     """
     Database model class
     """
 
     __tablename__ = 'c_cpp_workshop_august_2019'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(30))
+    name = db.Column(db.String(30), index=True)
     email = db.Column(db.String(50), unique=True)
     phone = db.Column(db.String(21), unique=True)
     department = db.Column(db.String(50))
@@ -46,14 +47,14 @@ class CCPPWSAugust2019(ValidateMixin, db.Model):
         return 'This workshop is <b>only</b> for FY students'
 
 
-class Hacktoberfest2019(ValidateMixin, db.Model):
+class Hacktoberfest2019(TimestampMixin, ValidateMixin, db.Model):
     """
     Database model class
     """
 
     __tablename__ = 'do_hacktoberfest_2019'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(30))
+    name = db.Column(db.String(30), index=True)
     email = db.Column(db.String(50), unique=True)
     phone = db.Column(db.String(21), unique=True)
     department = db.Column(db.String(50))
@@ -72,14 +73,14 @@ class Hacktoberfest2019(ValidateMixin, db.Model):
         ]
 
 
-class CNovember2019(ValidateMixin, db.Model):
+class CNovember2019(TimestampMixin, ValidateMixin, db.Model):
     """
     Database model class
     """
 
     __tablename__ = 'c_november_2019'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(30))
+    name = db.Column(db.String(30), index=True)
     email = db.Column(db.String(50), unique=True)
     phone = db.Column(db.String(21), unique=True)
     year = db.Column(db.String(3))
@@ -107,14 +108,14 @@ class CNovember2019(ValidateMixin, db.Model):
         return 'This workshop is <b>only</b> for SY students'
 
 
-class BitgritDecember2019(ValidateMixin, db.Model):
+class BitgritDecember2019(TimestampMixin, ValidateMixin, db.Model):
     """
     Database model class
     """
 
     __tablename__ = 'bitgrit_december_2019'
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(30))
+    name = db.Column(db.String(30), index=True)
     email = db.Column(db.String(50), unique=True)
     phone = db.Column(db.String(21), unique=True)
     department = db.Column(db.String(50))
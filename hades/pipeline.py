@@ -0,0 +1,210 @@
+"""
+Prepared plans for `/submit`
+
+How an event accepts registrations is read from the events file (`EVENTS_FILE`) once at startup, and compiled into a
+`SubmitPlan`. A submission then only runs its event's plan, instead of working out the allowed columns, email and
+Telegram formats from the form on every request.
+
+The events file is a JSON object keyed by table name, for example
+
+{
+    "coursera_2020": {
+        "event": "Coursera 2020",
+        "qr": true,
+        "date": "August, 2020",
+        "email_content": "<b>Hey there!</b><br/>",
+        "email_template": "Your PRN is {prn}",
+        "extra_message": "See you there!",
+        "chat_id": "-100123456",
+        "telegram_field": "prn",
+        "qr_exclude": ["year"]
+    }
+}
+
+Only `event` is required.
+-> qr - Whether to generate a QR code and attach it in the email, defaults to true
+-> date - Date shown in the email subject, defaults to the current month and year
+-> email_content - Content replacing the default email
+-> email_template - Content appended to the email, where `{field}` is replaced with the value of that column
+-> extra_message - Extra information to be appended to end of email
+-> chat_id - Telegram Chat ID where registrations should be logged, defaults to `GROUP_ID`
+-> telegram_field - Column to be logged to Telegram besides ID and name
+-> qr_exclude - Columns to be left out of the QR code
+"""
+
+import json
+import os
+from datetime import datetime
+from string import Formatter
+from typing import Dict, Union
+
+from decouple import config
+from flask_sqlalchemy import Model
+
+from .utils import QR_BLACKLIST, get_table_by_name
+
+EVENTS_FILE = config(
+    'EVENTS_FILE',
+    default=os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'events.json'
+    ),
+)
+
+# The list of fields that will be required for any and all form submissions
+REQUIRED_FIELDS = ('name', 'phone', 'email')
+
+DEFAULT_EMAIL = """<img src='https://drive.google.com/uc?id=12VCUzNvU53f_mR7Hbumrc6N66rCQO5r-&export=download' style='width:30%;height:50%'>
+<hr>
+{name}, your registration is done!
+<br/>
+"""
+
+QR_MESSAGE = """A QR code has been attached below!
+<br/>
+You're <b>required</b> to present this on the day of the event."""
+
+
+def escape(text: str) -> str:
+    """Escapes text so that it can be used as is in a format string"""
+    return text.replace('{', '{{').replace('}', '}}')
+
+
+class SubmitPlan:
+    """
+    Class holding everything `/submit` needs to know about one event, compiled from its entry in the events file
+
+    -> table: The event's database model class
+    -> event: The full name of the event
+    -> columns: Form fields which are accepted into the model
+    -> validators: Functions run on the new registrant, returning True or an error message
+    -> qr: Whether a QR code is generated
+    -> qr_blacklist: Attributes left out of the QR code
+    -> subject: Format string for the email subject
+    -> email: Format string for the email, with and without the QR code note
+    -> email_fields: Columns used in the email
+    -> chat_id: Telegram Chat ID where registrations are logged
+    -> caption: Format string for the Telegram caption
+    -> caption_fields: Columns used in the caption
+    """
+
+    def __init__(self, table: Model, options: dict, chat_id: str):
+        self.table = table
+        self.event = options['event']
+        self.columns = frozenset(
+            c.name
+            for c in table.__table__.columns
+            if not c.primary_key and c.name != 'created_at'
+        )
+        # Only tables with `ValidateMixin` check their registrations
+        validate = getattr(table, 'validate', None)
+        self.validators = (validate,) if validate is not None else ()
+
+        self.qr = options.get('qr', True)
+        self.qr_blacklist = QR_BLACKLIST + tuple(options.get('qr_exclude', ()))
+
+        date = options.get('date')
+        self.subject = (
+            f'Registration for {escape(self.event)} - '
+            + (escape(date) if date else '{date}')
+            + ' - ID {id}'
+        )
+
+        if 'email_content' in options or 'email_template' in options:
+            email = escape(options.get('email_content', ''))
+            email += options.get('email_template', '')
+            self.email = {False: email, True: email}
+        else:
+            self.email = {False: DEFAULT_EMAIL, True: DEFAULT_EMAIL + QR_MESSAGE}
+        if 'extra_message' in options:
+            for k in self.email:
+                self.email[k] += '{waitlist}<br/>' + escape(options['extra_message'])
+        else:
+            for k in self.email:
+                self.email[k] += '{waitlist}'
+        self.email_fields = self.get_fields(self.email[True], 'waitlist')
+
+        self.chat_id = str(options.get('chat_id', chat_id))
+        self.caption = 'Name: {name} | ID: {id}{waitlist}'
+        if 'telegram_field' in options:
+            field = options['telegram_field']
+            self.caption += f' | {escape(field)} - {{{field}}}'
+        self.caption_fields = self.get_fields(self.caption, 'waitlist')
+
+    def get_fields(self, format_string: str, *extra) -> tuple:
+        """
+        Function to get the fields used in a format string, ensuring that they are all columns of the table
+        :param format_string: The format string
+        :param extra: Fields which are filled in by the plan itself
+        :return: Names of the columns used
+        """
+        fields = []
+        for _, field, _, _ in Formatter().parse(format_string):
+            if field is None or field in extra or field in fields:
+                continue
+            if field != 'id' and field not in self.columns:
+                raise ValueError(
+                    f'{self.event} uses {field}, which is not a column of {self.table.__tablename__}'
+                )
+            fields.append(field)
+        return tuple(fields)
+
+    def build_user(self, form: dict, id_: int) -> Model:
+        """
+        Function to create the registrant from the submitted form, ignoring all fields which are not columns
+        :param form: The submitted form
+        :param id_: ID of the new registrant
+        :return: The model object
+        """
+        columns = self.columns
+        return self.table(**{k: v for k, v in form.items() if k in columns}, id=id_)
+
+    def validate(self, user: Model) -> Union[str, bool]:
+        """Runs all validators on the registrant, returning True or the first error"""
+        for validator in self.validators:
+            result = validator(user)
+            if result is not True:
+                return result
+        return True
+
+    def render_subject(self, user: Model) -> str:
+        """Returns the subject of the confirmation email"""
+        return self.subject.format(id=user.id, date=datetime.now().strftime('%B,%Y'))
+
+    def render_email(self, user: Model, qr: bool, waitlist_position: int) -> str:
+        """Returns the content of the confirmation email"""
+        waitlist = ''
+        if waitlist_position:
+            waitlist = f"""The event is full right now, you're number {waitlist_position} on the waitlist.
+<br/>
+We'll get in touch with you if a seat opens up."""
+        return self.email[qr].format(
+            waitlist=waitlist, **{f: getattr(user, f) for f in self.email_fields}
+        )
+
+    def render_caption(self, user: Model, waitlist_position: int) -> str:
+        """Returns the caption used to log the registration to Telegram"""
+        waitlist = f' | Waitlist #{waitlist_position}' if waitlist_position else ''
+        return self.caption.format(
+            waitlist=waitlist, **{f: getattr(user, f) for f in self.caption_fields}
+        )
+
+
+def load_plans(path: str = EVENTS_FILE) -> Dict[str, SubmitPlan]:
+    """
+    Function to compile the plans of all active events
+    :param path: Path to the events file
+    :return: Dictionary mapping the table name of each active event to its plan
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        events = json.load(f)
+
+    chat_id = config('GROUP_ID', default='')
+    plans = {}
+    for table_name, options in events.items():
+        table = get_table_by_name(table_name)
+        if table is None:
+            raise ValueError(f'Table {table_name} in {path} does not exist!')
+        plans[table_name] = SubmitPlan(table, options, chat_id)
+    return plans
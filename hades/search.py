@@ -0,0 +1,288 @@
+"""
+Search for registrants across all event tables
+
+The name, email, phone and PRN of everyone registered for any event are kept in a SQLite FTS5 index in `STATE_DIR`,
+so a search is a single lookup in the index rather than one query per table. The index is updated right after any
+transaction which inserts, updates or deletes registrants is committed. It is built, and rebuilt after writes made
+without the ORM or updates which failed, by `rebuild_search_index.py`. Until then, searches query the tables one by
+one.
+"""
+
+import time
+
+from flask import jsonify, request
+from flask_login import current_user, login_required
+from sqlalchemy import event
+
+from . import app, db
+from .db_utils import select_rows, stream_rows
+from .shared import connect, get_metric, set_max
+from .utils import (
+    DATABASE_CLASSES,
+    INTERNAL_TABLES,
+    SEARCH_COLUMNS,
+    get_accessible_tables,
+    get_column_names,
+    log,
+)
+
+SEARCH_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS documents (
+    event TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (event, user_id)
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS registrants USING fts5(name, email, phone, prn, prefix='2 3');
+CREATE TABLE IF NOT EXISTS search_meta (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+'''
+
+# Default and maximum number of results of a search
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+
+def get_indexed_tables() -> list:
+    """Returns the names of the event tables which are indexed"""
+    return [
+        name
+        for name, table in DATABASE_CLASSES.items()
+        if name not in INTERNAL_TABLES and 'id' in get_column_names(table)
+    ]
+
+
+# Names of the event tables which are indexed
+INDEXED_TABLES = frozenset(get_indexed_tables())
+
+
+def connect_index():
+    return connect(SEARCH_SCHEMA, 'search.db')
+
+
+def index_registrants(changes: dict):
+    """
+    Function to update the index
+    :param changes: Dictionary mapping (table name, ID) to a dictionary of the searchable values of the registrant,
+    or None if they were deleted
+    """
+    conn = connect_index()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        for (table_name, user_id), values in changes.items():
+            row = conn.execute(
+                'SELECT rowid FROM documents WHERE event = ? AND user_id = ?',
+                (table_name, user_id),
+            ).fetchone()
+            if row is not None:
+                conn.execute('DELETE FROM registrants WHERE rowid = ?', row)
+            if values is None:
+                conn.execute(
+                    'DELETE FROM documents WHERE event = ? AND user_id = ?',
+                    (table_name, user_id),
+                )
+                continue
+            if row is None:
+                row = (
+                    conn.execute(
+                        'INSERT INTO documents (event, user_id) VALUES (?, ?)',
+                        (table_name, user_id),
+                    ).lastrowid,
+                )
+            conn.execute(
+                'INSERT INTO registrants (rowid, name, email, phone, prn) VALUES (?, ?, ?, ?, ?)',
+                (*row, *(values.get(c) for c in SEARCH_COLUMNS)),
+            )
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def rebuild_index(force: bool = True):
+    """
+    Function to rebuild the index from all event tables, which must be called in an application context
+    :param force: Whether to rebuild the index even if it has already been built
+    """
+    # Changes which fail to be indexed after this are caught by the rebuild, as long as it hasn't read their table yet
+    start = time.time()
+    conn = connect_index()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        # Another worker may have built it while this one waited for the lock
+        if not force and is_index_built():
+            conn.execute('ROLLBACK')
+            return
+        conn.execute('DELETE FROM documents')
+        conn.execute('DELETE FROM registrants')
+        for table_name in get_indexed_tables():
+            table = DATABASE_CLASSES[table_name]
+            columns = ['id'] + [
+                c for c in SEARCH_COLUMNS if c in get_column_names(table)
+            ]
+            for rows in stream_rows(table, columns, chunk_size=5000):
+                for row in rows:
+                    values = dict(zip(columns, row))
+                    rowid = conn.execute(
+                        'INSERT INTO documents (event, user_id) VALUES (?, ?)',
+                        (table_name, values['id']),
+                    ).lastrowid
+                    conn.execute(
+                        'INSERT INTO registrants (rowid, name, email, phone, prn) VALUES (?, ?, ?, ?, ?)',
+                        (rowid, *(values.get(c) for c in SEARCH_COLUMNS)),
+                    )
+        conn.execute(
+            "INSERT OR REPLACE INTO search_meta (name, value) VALUES ('built', ?)",
+            (start,),
+        )
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+
+
+def is_index_built() -> bool:
+    """Returns whether the index has been built, and hasn't missed any change since"""
+    row = (
+        connect_index()
+        .execute("SELECT value FROM search_meta WHERE name = 'built'")
+        .fetchone()
+    )
+    return row is not None and get_metric('search.stale_since') < row[0]
+
+
+def mark_stale():
+    """Marks the index as missing changes, until it is rebuilt"""
+    set_max('search.stale_since', time.time())
+
+
+def search_tables(text: str, table_names: list, limit: int = SEARCH_LIMIT) -> list:
+    """
+    Function to search for registrants by querying the tables one by one, for when the index can't be used
+    :param text: Text which the name, email, phone or PRN of the registrants must start with
+    :param table_names: Names of the tables which are searched
+    :param limit: Maximum number of results
+    :return: List of (table name, ID, name, email, phone, PRN) tuples
+    """
+    results = []
+    for table_name in table_names:
+        if table_name not in INDEXED_TABLES or len(results) >= limit:
+            continue
+        table = DATABASE_CLASSES[table_name]
+        columns = [c for c in SEARCH_COLUMNS if c in get_column_names(table)]
+        for user_id, *values in select_rows(
+            table,
+            ['id'] + columns,
+            search=(text, columns),
+            limit=limit - len(results),
+        ):
+            values = dict(zip(columns, values))
+            results.append(
+                (table_name, user_id, *(values.get(c) for c in SEARCH_COLUMNS))
+            )
+    return results
+
+
+def build_match(text: str) -> str:
+    """Returns an FTS5 query matching registrants with a word starting with every word in the text"""
+    words = text.replace('"', ' ').split()
+    return ' AND '.join(f'"{word}"*' for word in words)
+
+
+def search_registrants(text: str, table_names: list, limit: int = SEARCH_LIMIT) -> list:
+    """
+    Function to search for registrants
+    :param text: Words which the name, email, phone or PRN of the registrants must start with
+    :param table_names: Names of the tables which are searched
+    :param limit: Maximum number of results
+    :return: List of (table name, ID, name, email, phone, PRN) tuples, best matches first
+    """
+    match = build_match(text)
+    if not match or not table_names:
+        return []
+    placeholders = ', '.join('?' * len(table_names))
+    return (
+        connect_index()
+        .execute(
+            'SELECT d.event, d.user_id, r.name, r.email, r.phone, r.prn FROM registrants r '
+            'JOIN documents d ON d.rowid = r.rowid '
+            f'WHERE registrants MATCH ? AND d.event IN ({placeholders}) '
+            'ORDER BY rank LIMIT ?',
+            (match, *table_names, limit),
+        )
+        .fetchall()
+    )
+
+
+@event.listens_for(db.session, 'after_flush')
+def record_registrant_changes(session, flush_context):
+    """Remembers the searchable values of the registrants inserted, updated or deleted in a flush"""
+    changes = session.info.setdefault('search_changes', {})
+    for obj in session.new | session.dirty:
+        if obj.__tablename__ in INDEXED_TABLES and obj not in session.deleted:
+            changes[(obj.__tablename__, obj.id)] = {
+                c: getattr(obj, c, None) for c in SEARCH_COLUMNS
+            }
+    for obj in session.deleted:
+        if obj.__tablename__ in INDEXED_TABLES:
+            changes[(obj.__tablename__, obj.id)] = None
+
+
+@event.listens_for(db.session, 'after_commit')
+def update_search_index(session):
+    changes = session.info.pop('search_changes', None)
+    if not changes:
+        return
+    try:
+        index_registrants(changes)
+    except Exception:
+        # The transaction is committed by now, so the request carries on, and searches query the tables until the
+        # index is rebuilt
+        app.logger.exception('Could not update the search index')
+        mark_stale()
+
+
+@event.listens_for(db.session, 'after_soft_rollback')
+def forget_registrant_changes(session, previous_transaction):
+    session.info.pop('search_changes', None)
+
+
+@app.route('/api/search')
+@login_required
+def search_api():
+    """
+    Returns a JSON consisting of the registrants, in all tables the user has access to, matching a search
+
+    -> q - Words which the name, email, phone or PRN of the registrants must start with
+    -> limit - Optional maximum number of results
+    """
+    text = request.args.get('q', '').strip()
+    if not text:
+        return jsonify({'message': 'Please provide all required data'}), 400
+    try:
+        limit = min(int(request.args.get('limit', SEARCH_LIMIT)), MAX_SEARCH_LIMIT)
+    except ValueError:
+        return jsonify({'message': 'limit must be a number'}), 400
+    if limit < 1:
+        return jsonify({'message': 'limit must be at least 1'}), 400
+
+    log(f'<code>{current_user.name}</code> is searching for {text}!')
+    tables = {
+        table.name: table.full_name
+        for table in get_accessible_tables()
+        if table.name not in INTERNAL_TABLES
+    }
+    # Building the index would hold its lock for too long to be done in a request
+    if is_index_built():
+        found = search_registrants(text, list(tables), limit)
+    else:
+        found = search_tables(text, list(tables), limit)
+    results = []
+    for table_name, user_id, *values in found:
+        result = {'table': table_name, 'event': tables[table_name], 'id': user_id}
+        result.update(
+            {k: v for k, v in zip(SEARCH_COLUMNS, values) if v is not None and v != ''}
+        )
+        results.append(result)
+    return jsonify(results), 200
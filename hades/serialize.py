@@ -0,0 +1,77 @@
+"""
+Fast serialization of table rows to JSON
+
+Read-only endpoints select plain rows with SQLAlchemy Core (see `db_utils.select_rows`) instead of loading ORM objects
+into the session, convert them with `utils.rows_to_json` using the column names computed once per table, and encode
+them with the fastest JSON library available. `JSON_ENCODER` picks the library (`orjson`, `ujson` or `json`), by
+default the first one installed. Values are encoded the same way as with `flask.jsonify` whichever library is used, so
+dates are still sent as HTTP dates.
+"""
+
+import json
+
+from decouple import config
+from flask import Response
+from flask.json import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+from .db_utils import select_rows
+from .utils import get_column_names, rows_to_json
+
+# Only its fallback for values which aren't JSON types is used
+_flask_encoder = JSONEncoder()
+
+
+def default(value):
+    """Encodes the values JSON has no type for, such as dates, the way `flask.jsonify` does"""
+    return _flask_encoder.default(value)
+
+
+def get_encoder(name: str):
+    """
+    Function to get the function encoding objects as JSON with the given library
+    :param name: `orjson`, `ujson`, `json`, or `auto` for the first one installed
+    :return: Function returning the JSON as bytes
+    """
+    if name == 'auto':
+        name = 'orjson' if orjson else 'ujson' if ujson else 'json'
+    if name == 'orjson' and orjson:
+        return lambda obj: orjson.dumps(
+            obj, default=default, option=orjson.OPT_PASSTHROUGH_DATETIME
+        )
+    if name == 'ujson' and ujson:
+        return lambda obj: ujson.dumps(obj, default=default).encode()
+    if name != 'json':
+        raise ValueError(f'JSON encoder {name} is not installed')
+    encoder = json.JSONEncoder(separators=(',', ':'), default=default)
+    return lambda obj: encoder.encode(obj).encode()
+
+
+encode = get_encoder(config('JSON_ENCODER', default='auto'))
+
+
+def json_response(obj, status: int = 200) -> Response:
+    """Returns a response holding an object encoded as JSON, like `flask.jsonify` but faster"""
+    return Response(encode(obj) + b'\n', status, mimetype='application/json')
+
+
+def table_to_json(table, columns: list = None, *args, **kwargs) -> list:
+    """
+    Function to read the rows of a table in the format of `users_to_json`, without loading any ORM objects
+    :param table: The table
+    :param columns: Names of the columns to be read, all columns by default
+    :param args: Passed on to `select_rows`, for filters and pagination
+    :return: List of dictionaries, leaving out empty values
+    """
+    if columns is None:
+        columns = get_column_names(table)
+    return rows_to_json(columns, select_rows(table, columns, *args, **kwargs))
@@ -0,0 +1,169 @@
+"""
+Helpers for state that has to be shared between all the gunicorn workers running on one host
+
+Everything lives in SQLite databases (in WAL mode) inside `STATE_DIR`, so no extra service is required
+"""
+
+import os
+import sqlite3
+import stat
+import threading
+from tempfile import gettempdir
+from typing import Dict
+
+from decouple import config
+
+
+def make_private_dir(path: str):
+    """
+    Function to create a directory only the current user can use, or to check that an existing one is
+
+    The shared state includes registrants' details and is trusted by the workers, so a directory someone else created
+    first, or which others can read or write, is refused rather than used
+    :param path: Path to the directory
+    :raises RuntimeError: If the directory exists but isn't private to the current user
+    """
+    try:
+        os.makedirs(path, mode=0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode):
+        raise RuntimeError(f'{path} is not a directory')
+    if info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise RuntimeError(
+            f'{path} has to be owned by the user running Hades and have permissions 0700'
+        )
+
+
+# Directory which holds the state shared between workers, private to the user running Hades
+STATE_DIR = config(
+    'STATE_DIR', default=os.path.join(gettempdir(), f'hades-{os.getuid()}')
+)
+make_private_dir(STATE_DIR)
+
+METRICS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS metrics (
+    name TEXT PRIMARY KEY,
+    value REAL NOT NULL
+);
+'''
+
+_local = threading.local()
+
+
+def get_path(name: str) -> str:
+    """
+    Function to get the path of a file in the shared state directory
+    :param name: Name of the file
+    :return: Absolute path to the file
+    """
+    return os.path.join(STATE_DIR, name)
+
+
+def connect(schema: str, name: str = 'state.db') -> sqlite3.Connection:
+    """
+    Function to get a connection to a shared SQLite database
+
+    Connections are cached per process and thread, as SQLite connections can be neither shared across a fork
+    nor across threads
+    :param schema: SQL script creating the tables the caller needs, run once per connection
+    :param name: Name of the database file in `STATE_DIR`
+    :return: Connection in autocommit mode
+    """
+    connections = getattr(_local, 'connections', None)
+    if connections is None or _local.pid != os.getpid():
+        connections = _local.connections = {}
+        _local.pid = os.getpid()
+
+    if name not in connections:
+        conn = sqlite3.connect(get_path(name), timeout=10, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        connections[name] = (conn, set())
+
+    conn, schemas = connections[name]
+    if schema not in schemas:
+        conn.executescript(schema)
+        schemas.add(schema)
+    return conn
+
+
+def incr(name: str, amount: float = 1):
+    """
+    Function to increment a shared metric
+    :param name: Name of the metric
+    :param amount: Value to be added to it
+    """
+    connect(METRICS_SCHEMA).execute(
+        'INSERT INTO metrics (name, value) VALUES (?, ?) '
+        'ON CONFLICT (name) DO UPDATE SET value = value + excluded.value',
+        (name, amount),
+    )
+
+
+def incr_and_get(name: str, amount: float = 1) -> float:
+    """
+    Function to increment a shared metric and read it back, without another worker changing it in between
+    :param name: Name of the metric
+    :param amount: Value to be added to it
+    :return: The new value of the metric
+    """
+    conn = connect(METRICS_SCHEMA)
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute(
+            'INSERT INTO metrics (name, value) VALUES (?, ?) '
+            'ON CONFLICT (name) DO UPDATE SET value = value + excluded.value',
+            (name, amount),
+        )
+        value = conn.execute(
+            'SELECT value FROM metrics WHERE name = ?', (name,)
+        ).fetchone()[0]
+        conn.execute('COMMIT')
+    except Exception:
+        conn.execute('ROLLBACK')
+        raise
+    return value
+
+
+def incr_many(amounts: Dict[str, float]):
+    """
+    Function to increment several shared metrics at once
+    :param amounts: Dictionary mapping the name of each metric to the value to be added to it
+    """
+    connect(METRICS_SCHEMA).executemany(
+        'INSERT INTO metrics (name, value) VALUES (?, ?) '
+        'ON CONFLICT (name) DO UPDATE SET value = value + excluded.value',
+        amounts.items(),
+    )
+
+
+def set_max(name: str, value: float):
+    """
+    Function to store the given value in a shared metric if it is larger than the current one
+    :param name: Name of the metric
+    :param value: The observed value
+    """
+    connect(METRICS_SCHEMA).execute(
+        'INSERT INTO metrics (name, value) VALUES (?, ?) '
+        'ON CONFLICT (name) DO UPDATE SET value = max(value, excluded.value)',
+        (name, value),
+    )
+
+
+def get_metric(name: str, default: float = 0) -> float:
+    """Returns the value of a shared metric"""
+    row = (
+        connect(METRICS_SCHEMA)
+        .execute('SELECT value FROM metrics WHERE name = ?', (name,))
+        .fetchone()
+    )
+    return default if row is None else row[0]
+
+
+def get_metrics() -> Dict[str, float]:
+    """Returns all of the shared metrics, sorted by name"""
+    return dict(
+        connect(METRICS_SCHEMA).execute('SELECT name, value FROM metrics ORDER BY name')
+    )
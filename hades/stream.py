@@ -0,0 +1,200 @@
+"""
+Live registration counts, streamed with Server-Sent Events
+
+Writers call `publish()` with the change in the number of registrations of a table right after committing it. Changes
+are appended to a channel in a shared SQLite database, which one thread per worker tails and fans out to the streams
+open in that worker, so every stream sees every change, whichever worker made it.
+
+Every change carries the version its transaction gave the table (see `db_utils.bump_versions`), and the snapshot a
+stream starts with is read along with the versions of the tables in a single query. A stream then only sends the
+changes with a higher version than its snapshot, so that no change is counted twice or missed.
+"""
+
+import json
+import queue
+import threading
+import time
+from random import random
+
+from decouple import config
+from flask import Response, jsonify, stream_with_context
+from flask_login import current_user, login_required
+
+from . import app, db
+from .admission import RETRY_AFTER
+from .shared import connect
+from .utils import (
+    INTERNAL_TABLES,
+    get_accessible_tables,
+    get_registration_snapshot,
+    log,
+)
+
+CHANNEL_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS count_deltas (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    event TEXT NOT NULL,
+    delta INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    at REAL NOT NULL
+);
+'''
+
+# Seconds between two reads of the shared channel
+POLL_INTERVAL = 0.5
+
+# Seconds between two keep-alive comments on an idle stream
+HEARTBEAT_INTERVAL = 15
+
+# Seconds for which changes are kept in the shared channel
+RETENTION = 300
+
+# Streams one worker may serve at once, which has to stay below its number of threads (4, see start.sh) so that a few
+# clients can't take every thread and starve the other requests
+STREAMS_PER_WORKER = config('STREAMS_PER_WORKER', default=2, cast=int)
+
+
+def publish(event: str, delta: int):
+    """
+    Function to announce a change in the number of registrations of a table to all streams, in all workers
+
+    It must be called right after the transaction making the change is committed, and before any other is
+    :param event: Name of the table
+    :param delta: Change in the number of registrations
+    """
+    version = db.session.info.get('committed_versions', {}).get(event, 0)
+    now = time.time()
+    conn = connect(CHANNEL_SCHEMA, 'channel.db')
+    conn.execute(
+        'INSERT INTO count_deltas (event, delta, version, at) VALUES (?, ?, ?, ?)',
+        (event, delta, version, now),
+    )
+    if random() < 0.01:
+        conn.execute('DELETE FROM count_deltas WHERE at < ?', (now - RETENTION,))
+
+
+class Broker:
+    """
+    Class to fan out the changes in the shared channel to the streams open in this worker
+
+    The thread tailing the channel is only started once the first stream subscribes
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = set()
+        self.thread = None
+
+    def subscribe(self) -> queue.Queue:
+        """
+        Returns a queue which will receive (event, delta, version) tuples for every change, or None if it falls
+        behind, None if this worker already serves `STREAMS_PER_WORKER` streams
+        """
+        subscriber = queue.Queue(maxsize=1000)
+        with self.lock:
+            if len(self.subscribers) >= STREAMS_PER_WORKER:
+                return None
+            self.subscribers.add(subscriber)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.tail, daemon=True)
+                self.thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue):
+        with self.lock:
+            self.subscribers.discard(subscriber)
+
+    def tail(self):
+        """Reads new changes from the shared channel, for as long as anyone is subscribed"""
+        conn = connect(CHANNEL_SCHEMA, 'channel.db')
+        last = conn.execute(
+            'SELECT coalesce(max(seq), 0) FROM count_deltas'
+        ).fetchone()[0]
+        while True:
+            with self.lock:
+                if not self.subscribers:
+                    self.thread = None
+                    return
+                subscribers = list(self.subscribers)
+            changes = conn.execute(
+                'SELECT seq, event, delta, version FROM count_deltas WHERE seq > ? ORDER BY seq',
+                (last,),
+            ).fetchall()
+            for last, event, delta, version in changes:
+                for subscriber in subscribers:
+                    try:
+                        subscriber.put_nowait((event, delta, version))
+                    except queue.Full:
+                        # A stream that can't keep up is better off reconnecting for a fresh snapshot
+                        self.unsubscribe(subscriber)
+                        subscriber.get_nowait()
+                        subscriber.put_nowait(None)
+            time.sleep(POLL_INTERVAL)
+
+
+broker = Broker()
+
+
+def format_event(name: str, data) -> str:
+    """Formats a Server-Sent Event"""
+    return f'event: {name}\ndata: {json.dumps(data)}\n\n'
+
+
+@app.route('/api/stats/stream')
+@login_required
+def stats_stream():
+    """
+    Streams the number of users registered per table the user has the permission to view
+
+    A `snapshot` event with all counts is sent first, followed by a `delta` event for every change
+    """
+    log(f'<code>{current_user.name}</code> is streaming the stats of events!')
+    tables = {
+        table.name: table.full_name
+        for table in get_accessible_tables()
+        if table.name not in INTERNAL_TABLES + ('test_users', 'tsg')
+    }
+    # Subscribe before taking the snapshot, so that no change is missed in between
+    subscriber = broker.subscribe()
+    if subscriber is None:
+        return (
+            jsonify({'message': 'Too many streams are open, please try again later'}),
+            503,
+            {'Retry-After': str(RETRY_AFTER)},
+        )
+    snapshot = get_registration_snapshot(list(tables))
+    # Don't hold on to a database connection for as long as the stream is open
+    db.session.close()
+
+    def generate():
+        try:
+            yield format_event(
+                'snapshot',
+                {tables[name]: count for name, (count, _) in snapshot.items()},
+            )
+            # Versions are unique per commit, but changes can reach the channel out of order, so each one is only
+            # compared with the snapshot and never with the changes sent before it
+            snapshot_versions = {
+                name: version for name, (_, version) in snapshot.items()
+            }
+            while True:
+                try:
+                    change = subscriber.get(timeout=HEARTBEAT_INTERVAL)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                # The stream fell behind, end it so that the client reconnects
+                if change is None:
+                    return
+                event, delta, version = change
+                # Changes up to the version of the snapshot are already counted in it
+                if event in snapshot_versions and version > snapshot_versions[event]:
+                    yield format_event('delta', {tables[event]: delta})
+        finally:
+            broker.unsubscribe(subscriber)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
@@ -57,13 +57,16 @@ class TG:
         chat_id,
         caption,
         file_name,
+        file_data=None,
         disable_notifications=False,
         parse_mode='HTML',
     ):
+        if file_data is None:
+            file_data = open(file_name, 'rb').read()
         data = {
             'caption': caption,
             'chat_id': chat_id,
-            'document': (file_name, open(file_name, 'rb').read()),
+            'document': (file_name, file_data),
             'disable_notification': disable_notifications,
             'parse_mode': parse_mode,
         }
@@ -4,22 +4,46 @@ from json import dumps
 import qrcode
 from cryptography.fernet import Fernet
 from decouple import config
-from flask import request
+from flask import g, request
 from flask_login import current_user
 from flask_sqlalchemy.model import Model
 from sendgrid import SendGridAPIClient
 from sendgrid.helpers.mail import Attachment, Content, Mail
-from sqlalchemy import desc
+from sqlalchemy import (
+    String,
+    and_,
+    case,
+    desc,
+    func,
+    literal,
+    or_,
+    select,
+    union,
+    union_all,
+)
 from sqlalchemy.exc import IntegrityError
 
+from .models.capacity import Capacity
+from .models.change import Change
 from .models.codex import CodexApril2019, RSC2019, CodexDecember2019, BOV2020
 from .models.csi import CSINovember2019, CSINovemberNonMember2019
 from .models.event import Events
 from .models.giveaway import Coursera2020
+from .models.group import Group
+from .models.group_access import GroupAccess
+from .models.membership import Membership
+from .models.rollup import Rollup
 from .models.techo import EHJuly2019, P5November2019
 from .models.test import TestTable
 from .models.user import Users, TSG
 from .models.user_access import Access
+from .models.version import TableVersion
+from .models.validate import (
+    MIN_PHONE_LENGTH,
+    ValidateMixin,
+    get_phone_keys,
+    split_phones,
+)
 from .models.workshop import (
     CPPWSMay2019,
     CCPPWSAugust2019,
@@ -28,6 +52,8 @@ from .models.workshop import (
     BitgritDecember2019,
 )
 
+from . import db
+from .cache import access_cache, events_cache
 from .telegram import TG
 
 from .db_utils import *
@@ -58,25 +84,67 @@ DATABASE_CLASSES = {
     'bitgrit_december_2019': BitgritDecember2019,
     'test_users': TestTable,
     'access': Access,
+    'capacity': Capacity,
+    'changes': Change,
     'users': Users,
     'events': Events,
     'codex_december_2019': CodexDecember2019,
     'bov_2020': BOV2020,
     'coursera_2020': Coursera2020,
+    'rollups': Rollup,
+    'groups': Group,
+    'group_access': GroupAccess,
+    'memberships': Membership,
     'tsg': TSG,
+    'table_versions': TableVersion,
 }
 
+# Tables used by Hades itself, which are not events
+INTERNAL_TABLES = (
+    'access',
+    'capacity',
+    'change_purges',
+    'changes',
+    'events',
+    'group_access',
+    'groups',
+    'memberships',
+    'rollups',
+    'table_versions',
+    'users',
+    'waitlist',
+)
+
 QR_BLACKLIST = (
+    'created_at',
     'paid',
     '_sa_instance_state',
 )
 
 
+# Names of the columns of each table, computed once per table
+_column_names = {}
+
+
+def get_column_names(table: Model) -> tuple:
+    """Returns the names of the columns of a table, in order"""
+    columns = _column_names.get(table)
+    if columns is None:
+        columns = _column_names[table] = tuple(table.__table__.columns.keys())
+    return columns
+
+
+def get_sortable_columns(table: Model) -> tuple:
+    """Returns the names of the columns of a table which have an index, and can be sorted by cheaply"""
+    columns = table.__table__.columns
+    return tuple(c.name for c in columns if c.primary_key or c.unique or c.index)
+
+
 def users_to_json(users: list) -> list:
     json_data = []
     for user in users:
         user_data = {}
-        for k in user.__table__.columns._data.keys():
+        for k in get_column_names(type(user)):
             value = getattr(user, k)
             if value is not None and value != '':
                 user_data[k] = value
@@ -85,8 +153,29 @@ def users_to_json(users: list) -> list:
     return json_data
 
 
+def rows_to_json(columns: list, rows: list) -> list:
+    """
+    Function to convert rows selected with `select_rows` to the same format as `users_to_json`
+    :param columns: Names of the selected columns
+    :param rows: The rows
+    :return: List of dictionaries, leaving out empty values
+    """
+    return [
+        {k: v for k, v in zip(columns, row) if v is not None and v != ''}
+        for row in rows
+    ]
+
+
 def log(message: str):
-    """Logs the given `message` to our Telegram logging channel"""
+    """
+    Logs the given `message` to our Telegram logging channel
+
+    Within a batch of requests, messages are collected and logged together once the batch is done
+    """
+    batched = g.get('batched_log')
+    if batched is not None:
+        batched.append(message)
+        return
     try:
         app, version = request.headers.get('User-Agent').split('/')
         tg.send_message(log_channel, f'<b>Hades/{app}/{version}</b>: {message}')
@@ -99,9 +188,7 @@ def log(message: str):
 
 def check_access(table_name: str) -> bool:
     """Returns whether or not the currently logged in user has access to `table_name`"""
-    return Access.query.filter(Access.user == current_user.username).filter(
-        Access.event == table_name
-    )
+    return any(table.name == table_name for table in get_accessible_tables())
 
 
 def get_table_by_name(name: str) -> Model:
@@ -111,19 +198,168 @@ def get_table_by_name(name: str) -> Model:
 
 def get_table_full_name(name: str) -> str:
     """Returns the full name of the table"""
-    return Events.query.filter(Events.name == name).first().full_name
+    return events_cache.get_or_set(
+        name, lambda: Events.query.filter(Events.name == name).first().full_name
+    )
 
 
-def get_accessible_tables():
-    """Returns the list of tables the currently logged in user can access"""
-    return (
-        Events.query.filter(Users.username == current_user.username)
-        .filter(Users.username == Access.user)
-        .filter(Access.event == Events.name)
-        .all()
+def get_registration_counts(table_names: list) -> dict:
+    """
+    Function to count the rows in the given tables with a single query (a UNION ALL of one COUNT(*) per table)
+    :param table_names: Names of the tables to be counted, unknown names are skipped
+    :return: Dictionary mapping each table name to its number of rows
+    """
+    tables = [get_table_by_name(name) for name in table_names]
+    counts = [
+        select(
+            [literal(table.__tablename__).label('name'), func.count().label('count')]
+        ).select_from(table.__table__)
+        for table in tables
+        if table is not None
+    ]
+    if not counts:
+        return {}
+    return dict(db.session.execute(union_all(*counts)).fetchall())
+
+
+def get_registration_snapshot(table_names: list) -> dict:
+    """
+    Function to count the rows in the given tables along with their versions, with a single query so that each count
+    is exactly the one at its version
+    :param table_names: Names of the tables to be counted, unknown names are skipped
+    :return: Dictionary mapping each table name to a tuple of its number of rows and its version
+    """
+    tables = [get_table_by_name(name) for name in table_names]
+    versions = TableVersion.__table__
+    counts = [
+        select(
+            [
+                literal(table.__tablename__).label('name'),
+                func.count().label('count'),
+                select([func.coalesce(func.max(versions.c.version), 0)])
+                .where(versions.c.name == table.__tablename__)
+                .as_scalar()
+                .label('version'),
+            ]
+        ).select_from(table.__table__)
+        for table in tables
+        if table is not None
+    ]
+    if not counts:
+        return {}
+    return {
+        name: (count, version)
+        for name, count, version in db.session.execute(union_all(*counts))
+    }
+
+
+def first_word(column, dialect: str):
+    """Returns an SQL expression for the part of a string column before the first space"""
+    if dialect == 'mysql':
+        return func.substring_index(column, ' ', 1)
+    if dialect == 'postgresql':
+        return func.split_part(column, ' ', 1)
+    return case(
+        [
+            (
+                func.instr(column, ' ') > 0,
+                func.substr(column, 1, func.instr(column, ' ') - 1),
+            )
+        ],
+        else_=column,
     )
 
 
+def after_pipe(column, dialect: str):
+    """Returns an SQL expression for the part of a string column after a `|`, or all of it if there is none"""
+    if dialect == 'mysql':
+        return func.substring_index(column, '|', -1)
+    if dialect == 'postgresql':
+        return case(
+            [(column.contains('|'), func.split_part(column, '|', 2))], else_=column
+        )
+    return func.substr(column, func.instr(column, '|') + 1)
+
+
+def get_contacts(table_names: list) -> list:
+    """
+    Function to get the distinct contacts (first name and WhatsApp number) of everyone in the given tables
+
+    Everything happens in one query - the name is cut down to the title-cased first word and the phone number to the
+    WhatsApp number (the part after `|`), and UNION removes the duplicates, so only distinct contacts are sent back.
+    Group registrations (names with a comma) are skipped.
+    :param table_names: Names of the tables, ones without a name and phone are skipped
+    :return: List of dictionaries with `name` and `phone`
+    """
+    dialect = db.session.get_bind().dialect.name
+    selects = []
+    for table_name in table_names:
+        table = get_table_by_name(table_name)
+        if table is None:
+            continue
+        t = table.__table__
+        if 'name' not in t.c or 'phone' not in t.c:
+            continue
+        word = first_word(t.c.name, dialect)
+        selects.append(
+            select(
+                [
+                    (
+                        func.upper(func.substr(word, 1, 1), type_=String)
+                        + func.lower(func.substr(word, 2), type_=String)
+                    ).label('name'),
+                    after_pipe(t.c.phone, dialect).label('phone'),
+                ]
+            ).where(
+                and_(
+                    t.c.name.isnot(None),
+                    t.c.phone.isnot(None),
+                    ~t.c.name.contains(','),
+                )
+            )
+        )
+    if not selects:
+        return []
+    return [
+        {'name': name, 'phone': phone}
+        for name, phone in db.session.execute(union(*selects))
+    ]
+
+
+def get_accessible_tables():
+    """
+    Returns the list of tables the currently logged in user can access, either directly or through the groups they are
+    a member of
+
+    Groups with `all_events` set give access to every event, so new events need no grants at all
+    """
+    username = current_user.username
+
+    def query():
+        direct = db.session.query(Access.event).filter(Access.user == username)
+        grouped = (
+            db.session.query(GroupAccess.event)
+            .join(Membership, Membership.group == GroupAccess.group)
+            .filter(Membership.user == username)
+        )
+        everything = (
+            db.session.query(Membership.group)
+            .join(Group, Group.name == Membership.group)
+            .filter(Membership.user == username)
+            .filter(Group.all_events.is_(True))
+            .exists()
+        )
+        return [
+            (table.name, table.full_name)
+            for table in Events.query.filter(
+                or_(Events.name.in_(direct), Events.name.in_(grouped), everything)
+            ).all()
+        ]
+
+    tables = access_cache.get_or_set(username, query)
+    return [Events(name=name, full_name=full_name) for name, full_name in tables]
+
+
 def update_user(id_: int, table: Model, user_data: dict) -> (bool, str):
     """
     :param id_ -> User ID
@@ -159,6 +395,15 @@ def update_user(id_: int, table: Model, user_data: dict) -> (bool, str):
     return success, f'{user} has been successfully updated!'
 
 
+def log_promotions():
+    """Logs the registrants moved up from waitlists by the last commit (see `release_seats`), so that they can be told"""
+    for event, ids in db.session.info.pop('promoted', {}).items():
+        log(
+            f'Moved IDs {", ".join(str(i) for i in ids)} of <code>{event}</code> up from the waitlist, '
+            'please let them know they have a seat!'
+        )
+
+
 def delete_user(id_: int, table_name: str) -> (bool, str):
     """
     :param id_ -> User ID
@@ -182,9 +427,76 @@ def delete_user(id_: int, table_name: str) -> (bool, str):
     log(
         f'User <code>{current_user.name}</code> has deleted <code>{user}</code> from <code>{table_name}</code>!'
     )
+    log_promotions()
     return success, f'{current_user.name} has deleted {user} from {table_name}'
 
 
+def find_invalid_rows(table: Model, rows: list) -> dict:
+    """
+    Function to check many new users at once for values which have to be unique, against the users already in the
+    table and against each other
+
+    The existing values of every unique column are loaded into a set once, rather than queried for every user. Tables
+    validating their registrations (see `ValidateMixin`) also need unique emails and phone numbers of 10 digits or more,
+    where a number is taken if it appears within another registration's, as on `/submit` (see `get_phone_keys`).
+    :param table: The table the users are to be inserted into
+    :param rows: Dictionaries of the values of the users
+    :return: Dictionary mapping the index of every invalid row to the reason
+    """
+    t = table.__table__
+    validated = issubclass(table, ValidateMixin)
+    unique = [
+        c.name
+        for c in t.columns
+        if (c.unique or c.primary_key or (validated and c.name in ('email', 'phone')))
+        and any(row.get(c.name) for row in rows)
+    ]
+
+    def split(column: str, value) -> list:
+        # Several phone numbers may be given separated with |, and each has to be unique on its own
+        if column == 'phone':
+            return split_phones(value)
+        return [str(value)]
+
+    def get_keys(column: str, value) -> set:
+        # The values a later user may not have, given those of an earlier one
+        if validated and column == 'phone':
+            return get_phone_keys(value)
+        return set(split(column, value))
+
+    existing = {}
+    for column in unique:
+        existing[column] = set()
+        for (value,) in db.session.execute(select([t.c[column]])):
+            if value is not None:
+                existing[column].update(get_keys(column, value))
+    batch = {column: set() for column in unique}
+
+    errors = {}
+    for i, row in enumerate(rows):
+        values = {
+            column: split(column, row[column]) for column in unique if row.get(column)
+        }
+        for column, parts in values.items():
+            for part in parts:
+                if validated and column == 'phone' and len(part) < MIN_PHONE_LENGTH:
+                    errors[i] = f'Phone number {part} is too short'
+                elif part in existing[column]:
+                    errors[i] = f'{column} {part} already found in database'
+                elif part in batch[column]:
+                    errors[i] = f'{column} {part} appears more than once in the import'
+                else:
+                    continue
+                break
+            if i in errors:
+                break
+        else:
+            for column, parts in values.items():
+                for part in parts:
+                    batch[column].update(get_keys(column, part))
+    return errors
+
+
 def get_current_id(table: Model) -> int:
     """Function to return the latest ID based on the database entries. 1 if DB is empty."""
     try:
@@ -194,9 +506,9 @@ def get_current_id(table: Model) -> int:
     return int(id_) + 1
 
 
-def generate_qr(user):
-    """Function to generate and return a QR code based on the given data."""
-    data = {k: v for k, v in user.__dict__.items() if k not in QR_BLACKLIST}
+def generate_qr(user, blacklist: tuple = QR_BLACKLIST):
+    """Function to generate and return a QR code based on the given data, leaving out the blacklisted attributes."""
+    data = {k: v for k, v in user.__dict__.items() if k not in blacklist}
     data['table'] = user.__tablename__
     return qrcode.make(base64.b64encode(dumps(data).encode()))
 
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+from sys import exit
+
+from sqlalchemy import func
+
+from hades import db
+from hades.db_utils import count_waiting, release_seats
+from hades.models.capacity import Capacity
+from hades.models.waitlist import Waitlist
+from hades.utils import get_table_by_name
+
+print('Current limits:')
+for capacity in db.session.query(Capacity).all():
+    print(
+        f'{capacity.event} - {capacity.registered} registered, {capacity.seats} seats, '
+        f'{count_waiting(capacity.event)} of {capacity.waitlist} on waitlist'
+    )
+
+table_name = input('Enter table name: ')
+table = get_table_by_name(table_name)
+if table is None:
+    print(f'Table {table_name} does not exist!')
+    exit(1)
+
+seats = input(f'Enter number of seats for {table_name} (empty to remove the limit): ')
+if not seats:
+    waiting = [
+        w.user_id
+        for w in db.session.query(Waitlist)
+        .filter(Waitlist.event == table_name)
+        .order_by(Waitlist.seq)
+    ]
+    db.session.query(Waitlist).filter(Waitlist.event == table_name).delete()
+    db.session.query(Capacity).filter(Capacity.event == table_name).delete()
+    db.session.commit()
+    print(f'Removed the limit on {table_name}')
+    if waiting:
+        print(f'IDs {waiting} were on the waitlist and now have a seat, let them know!')
+    exit(0)
+waitlist = input('Enter size of the waitlist (empty for none): ') or 0
+
+# Seed the counter from the table itself, so it is exact from here on
+capacity = db.session.query(Capacity).with_for_update().get(table_name)
+if capacity is None:
+    capacity = Capacity(event=table_name)
+    db.session.add(capacity)
+capacity.seats = int(seats)
+capacity.waitlist = int(waitlist)
+capacity.registered = db.session.query(func.count()).select_from(table).scalar()
+db.session.flush()
+# Seats which have been added go to the people waiting for them first
+promoted = release_seats(table, [])
+db.session.commit()
+if promoted:
+    print(f'IDs {promoted} have been moved up from the waitlist, let them know!')
+print(
+    f'{table_name} now has {capacity.seats} seats and a waitlist of {capacity.waitlist}, {capacity.registered} registered'
+)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+
+from sys import exit
+
+from sqlalchemy.exc import IntegrityError
+
+from hades import db
+from hades.models.event import Events
+from hades.models.group import Group
+from hades.models.group_access import GroupAccess
+from hades.models.membership import Membership
+from hades.models.user import Users
+
+print('Current groups:')
+for group in db.session.query(Group).all():
+    events = (
+        'all events'
+        if group.all_events
+        else ', '.join(
+            event
+            for (event,) in db.session.query(GroupAccess.event).filter(
+                GroupAccess.group == group.name
+            )
+        )
+        or 'no events'
+    )
+    members = ', '.join(
+        user
+        for (user,) in db.session.query(Membership.user).filter(
+            Membership.group == group.name
+        )
+    )
+    print(f'{group.name} - {events} - members: {members or "none"}')
+
+name = input('Enter group name: ')
+group = db.session.query(Group).get(name)
+if group is None:
+    all_events = input(f'Should {name} have access to all events? (y/N): ') == 'y'
+    group = Group(name=name, all_events=all_events)
+    db.session.add(group)
+
+if not group.all_events:
+    events = input(f'Enter events {name} should have access to, separated by spaces: ')
+    for event in events.split():
+        if db.session.query(Events).get(event) is None:
+            print(f'Event {event} does not seem to exist!')
+            exit(1)
+        db.session.merge(GroupAccess(group=name, event=event))
+
+usernames = input(f'Enter usernames to be added to {name}, separated by spaces: ')
+for username in usernames.split():
+    if db.session.query(Users).get(username) is None:
+        print(f'User {username} does not seem to exist!')
+        exit(1)
+    db.session.merge(Membership(group=name, user=username))
+
+try:
+    db.session.commit()
+except IntegrityError:
+    print('IntegrityError, what did you do!')
+    exit(1)
+print(f'Updated group {name}')
@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+
+from sqlalchemy import inspect
+
+from hades import db
+
+# Create any tables that don't exist yet
+db.create_all()
+
+inspector = inspect(db.engine)
+for table in db.metadata.sorted_tables:
+    existing = {column['name'] for column in inspector.get_columns(table.name)}
+    for column in table.columns:
+        if column.name in existing:
+            continue
+        column_type = column.type.compile(dialect=db.engine.dialect)
+        db.engine.execute(
+            f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'
+        )
+        print(f'Added column {column.name} to {table.name}')
+
+    existing = {index['name'] for index in inspector.get_indexes(table.name)}
+    for index in table.indexes:
+        if index.name not in existing:
+            index.create(db.engine)
+            print(f'Created index {index.name} on {table.name}')
@@ -0,0 +1,12 @@
+#!/usr/bin/env python3
+
+from time import perf_counter
+
+from hades import app
+from hades.search import connect_index, rebuild_index
+
+with app.app_context():
+    start = perf_counter()
+    rebuild_index()
+    count = connect_index().execute('SELECT count(*) FROM documents').fetchone()[0]
+    print(f'Indexed {count} registrants in {perf_counter() - start:.2f} seconds')
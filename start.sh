@@ -5,4 +5,5 @@
 [[ -d "venv" ]] || python3.8 -m venv ./venv
 source venv/bin/activate
 pip install -U -r requirements.txt
-gunicorn hades:app -b :5500 --workers=8
+# Threaded workers, so that open event streams don't each tie up a whole worker
+gunicorn hades:app -b :5500 --workers=8 --worker-class=gthread --threads=4
@@ -0,0 +1,53 @@
+import base64
+import os
+import tempfile
+
+import pytest
+from cryptography.fernet import Fernet
+
+# Hades reads its configuration when it is imported
+_state = tempfile.mkdtemp()
+os.environ.setdefault('SECRET_KEY', 'test')
+os.environ.setdefault('SENDGRID_API_KEY', 'test')
+os.environ.setdefault('FERNET_KEY', Fernet.generate_key().decode())
+os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(_state, "hades.db")}'
+os.environ['STATE_DIR'] = os.path.join(_state, 'state')
+
+from hades import app, db  # noqa: E402
+from hades.cache import backend  # noqa: E402
+from hades.models.event import Events  # noqa: E402
+from hades.models.user import Users  # noqa: E402
+from hades.models.user_access import Access  # noqa: E402
+from hades.utils import DATABASE_CLASSES  # noqa: E402
+
+
+def credentials(username: str) -> dict:
+    """Returns the headers authenticating a request as the user"""
+    return {
+        'Credentials': base64.b64encode(f'{username}|password'.encode()).decode(),
+        'User-Agent': 'Charon/1.0',
+    }
+
+
+def add_user(username: str):
+    user = Users(name=username.title(), username=username, email=f'{username}@test')
+    user.generate_password_hash('password')
+    db.session.add(user)
+    db.session.commit()
+
+
+@pytest.fixture
+def client():
+    """Returns a test client on an empty database with every event, and an `admin` with access to all of them"""
+    with app.app_context():
+        # The shared state outlives the database, and results cached for one test would be valid for the next
+        backend.clear()
+        db.drop_all()
+        db.create_all()
+        add_user('admin')
+        for name in DATABASE_CLASSES:
+            db.session.add(Events(name=name, full_name=name.title()))
+            db.session.add(Access(event=name, user='admin'))
+        db.session.commit()
+        yield app.test_client()
+        db.session.remove()
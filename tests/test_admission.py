@@ -0,0 +1,33 @@
+import os
+
+from hades.admission import (
+    ROUTE_CLASSES,
+    RouteClass,
+    _try_lock,
+    acquire_slot,
+    take_token,
+)
+from hades.shared import get_metric
+
+
+def test_queue_depth_is_counted(client):
+    route_class = RouteClass(
+        'probe', concurrency=1, queue=2, timeout=0.05, rate=0, burst=0
+    )
+    slot = _try_lock('slot', route_class, route_class.concurrency)
+    try:
+        assert acquire_slot(route_class) is None
+    finally:
+        os.close(slot)
+    assert get_metric('admission.probe.waiting') == 0
+    assert get_metric('admission.probe.queue_depth_max') == 1
+    # Nothing holds the queue slots once the request gave up
+    queue = _try_lock('queue', route_class, route_class.queue)
+    assert queue is not None
+    os.close(queue)
+
+
+def test_submit_bucket_allows_a_shared_ip(client):
+    # A room full of people registering from behind one address
+    for _ in range(20):
+        assert take_token(ROUTE_CLASSES['submit'], '10.0.0.1') == 0
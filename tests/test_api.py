@@ -0,0 +1,72 @@
+import pytest
+
+from hades import app
+
+from .conftest import credentials
+
+
+@pytest.mark.parametrize('limit', ['0', '-1'])
+def test_users_rejects_limit_below_one(client, limit):
+    response = client.get(
+        f'/api/users?table=bov_2020&limit={limit}', headers=credentials('admin')
+    )
+    assert response.status_code == 400
+
+
+def test_users_paginates(client):
+    headers = credentials('admin')
+    for i in range(3):
+        client.post(
+            '/api/create',
+            data={
+                'table': 'bov_2020',
+                'name': f'User {i}',
+                'email': f'user{i}@test',
+                'phone': str(9000000000 + i),
+            },
+            headers=headers,
+        )
+    page = client.get('/api/users?table=bov_2020&limit=2', headers=headers).json
+    assert len(page['users']) == 2
+    rest = client.get(
+        f'/api/users?table=bov_2020&limit=2&after={page["next"]}', headers=headers
+    ).json
+    assert len(rest['users']) == 1 and rest['next'] is None
+
+
+def test_batch_survives_a_failing_request(client, monkeypatch):
+    def fail():
+        raise RuntimeError('broken')
+
+    monkeypatch.setitem(app.view_functions, 'events_api', fail)
+    response = client.post(
+        '/api/batch',
+        json=[{'path': '/api/events'}, {'path': '/api/users?table=bov_2020'}],
+        headers=credentials('admin'),
+    )
+    assert response.status_code == 200
+    failed, succeeded = response.get_json()
+    assert failed['status'] == 500
+    assert succeeded['status'] == 200
+
+
+def test_ndjson_needs_an_id(client):
+    headers = credentials('admin')
+    response = client.get('/api/users?table=users&format=ndjson', headers=headers)
+    assert response.status_code == 400
+    response = client.get('/api/users?table=bov_2020&format=ndjson', headers=headers)
+    assert response.status_code == 200
+
+
+def test_batch_rejects_malformed_requests(client):
+    response = client.post(
+        '/api/batch',
+        json=[
+            {'path': '/api/events', 'headers': ['x']},
+            {'path': '/api/events', 'data': [1]},
+            {'path': '/api/users?table=bov_2020'},
+        ],
+        headers=credentials('admin'),
+    )
+    assert response.status_code == 200
+    assert [r['status'] for r in response.get_json()] == [400, 400, 200]
@@ -0,0 +1,26 @@
+import pickle
+from datetime import datetime
+
+from hades.cache import MISSING, LRUCache, SharedCache
+
+
+def test_shared_cache_round_trip():
+    cache = SharedCache(1024 * 1024, 'test_cache.db')
+    value = {'users': [{'id': 1, 'created_at': datetime(2020, 1, 2, 3, 4, 5, 6)}]}
+    cache.set('key', value)
+    assert cache.get('key') == value
+
+
+def test_shared_cache_never_unpickles():
+    cache = SharedCache(1024 * 1024, 'test_cache.db')
+    cache.connect().execute(
+        'INSERT OR REPLACE INTO entries (key, value, size, expires, stored) VALUES (?, ?, ?, NULL, 0)',
+        ('pickled', pickle.dumps({'a': 1}), 1),
+    )
+    assert cache.get('pickled') is MISSING
+
+
+def test_uncacheable_values_are_skipped():
+    cache = LRUCache(1024)
+    cache.set('key', object())
+    assert cache.get('key') is MISSING
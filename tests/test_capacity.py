@@ -0,0 +1,79 @@
+import pytest
+
+from hades import db
+from hades.db_utils import claim_seat, delete_row_from_table, insert, release_seats
+from hades.models.capacity import Capacity
+from hades.models.waitlist import Waitlist
+from hades.utils import DATABASE_CLASSES
+
+from .conftest import credentials
+
+
+@pytest.mark.parametrize(
+    'registered, released, left', [(5, 2, 3), (2, 2, 0), (1, 3, 0)]
+)
+def test_release_seats_never_goes_negative(client, registered, released, left):
+    db.session.add(Capacity(event='bov_2020', seats=10, registered=registered))
+    db.session.commit()
+    release_seats(DATABASE_CLASSES['bov_2020'], list(range(released)))
+    db.session.commit()
+    assert Capacity.query.get('bov_2020').registered == left
+
+
+def register(id_: int):
+    """Registers a user the way `/submit` does, returning their position on the waitlist"""
+    table = DATABASE_CLASSES['bov_2020']
+    user = table(id=id_, name=f'User {id_}', email=f'{id_}@test', phone=str(id_))
+    position = claim_seat(table, user_id=id_)
+    if position is not None:
+        insert([user])
+    return position
+
+
+def get_waitlist() -> list:
+    return [
+        w.user_id
+        for w in Waitlist.query.filter_by(event='bov_2020').order_by(Waitlist.seq)
+    ]
+
+
+def test_waitlist_is_promoted_in_order(client):
+    db.session.add(Capacity(event='bov_2020', seats=1, waitlist=2))
+    db.session.commit()
+    assert [register(i) for i in range(1, 5)] == [0, 1, 2, None]
+    assert get_waitlist() == [2, 3]
+
+    table = DATABASE_CLASSES['bov_2020']
+    delete_row_from_table(table.query.get(1))
+    # The first person waiting gets the free seat, rather than the next to register
+    assert get_waitlist() == [3]
+    assert register(5) == 2
+    assert get_waitlist() == [3, 5]
+
+    # Leaving the waitlist frees no seat
+    delete_row_from_table(table.query.get(3))
+    assert get_waitlist() == [5]
+    assert Capacity.query.get('bov_2020').registered == 2
+
+
+def test_waitlist_api(client):
+    db.session.add(Capacity(event='bov_2020', seats=0, waitlist=2))
+    db.session.commit()
+    register(7)
+    register(8)
+    response = client.get('/api/waitlist?table=bov_2020', headers=credentials('admin'))
+    assert response.get_json() == {'waitlist': [7, 8]}
+
+
+def test_deleting_through_the_api_promotes(client):
+    db.session.add(Capacity(event='bov_2020', seats=1, waitlist=1))
+    db.session.commit()
+    register(1)
+    register(2)
+    response = client.delete(
+        '/api/delete',
+        data={'table': 'bov_2020', 'id': '1'},
+        headers=credentials('admin'),
+    )
+    assert response.status_code == 200
+    assert get_waitlist() == []
@@ -0,0 +1,45 @@
+from datetime import datetime, timedelta
+
+from hades import db
+from hades.db_utils import purge_changes, record_changed_rows
+from hades.models.user import TSG
+
+from .conftest import credentials
+
+
+def sync(client, table: str, since=None):
+    url = f'/api/users/changes?table={table}'
+    if since is not None:
+        url += f'&since={since}'
+    return client.get(url, headers=credentials('admin'))
+
+
+def test_tables_without_timestamps_are_logged(client):
+    db.session.add(TSG(id=1, name='Member', email='member@test', phone='9000000000'))
+    db.session.commit()
+    cursor = sync(client, 'tsg').get_json()['next']
+
+    TSG.query.get(1).name = 'Renamed'
+    db.session.commit()
+    response = sync(client, 'tsg', cursor).get_json()
+    assert [user['name'] for user in response['users']] == ['Renamed']
+
+
+def test_quiet_table_keeps_its_cursor(client):
+    record_changed_rows('bov_2020', [1], 'u')
+    db.session.commit()
+    cursor = sync(client, 'bov_2020').get_json()['next']
+
+    # Another table keeps changing until the log is purged past this cursor
+    record_changed_rows('rsc_2019', [1, 2], 'u')
+    db.session.commit()
+    purge_changes(db.session, datetime.utcnow() + timedelta(seconds=1))
+    db.session.commit()
+    record_changed_rows('rsc_2019', [3], 'u')
+    db.session.commit()
+
+    assert sync(client, 'bov_2020', cursor).status_code == 200
+    assert sync(client, 'rsc_2019', cursor).status_code == 410
+    # Syncing again starts after the purged changes
+    cursor = sync(client, 'rsc_2019').get_json()['next']
+    assert sync(client, 'rsc_2019', cursor).status_code == 200
@@ -0,0 +1,27 @@
+from hades import db
+from hades.db_utils import stream_rows
+from hades.utils import DATABASE_CLASSES
+
+# Not imported by name, as pytest would try to collect a class called Test* as tests
+Table = DATABASE_CLASSES['test_users']
+
+
+def add_rows(count: int):
+    for i in range(count):
+        db.session.add(Table(name=f'User {i}', email=f'{i}@test', phone=str(i)))
+    db.session.commit()
+
+
+def test_stream_rows_reads_in_chunks(client):
+    add_rows(5)
+    chunks = list(stream_rows(Table, ['name'], chunk_size=2))
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+    assert [row for chunk in chunks for row in chunk] == [
+        (f'User {i}',) for i in range(5)
+    ]
+
+
+def test_stream_rows_filters(client):
+    add_rows(4)
+    chunks = list(stream_rows(Table, ['id', 'email'], {'phone': '2'}, chunk_size=1))
+    assert [tuple(row) for chunk in chunks for row in chunk] == [(3, '2@test')]
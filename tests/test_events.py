@@ -0,0 +1,29 @@
+from hades import db
+from hades.models.user_access import Access
+
+from .conftest import add_user, credentials
+
+
+def test_events_page_requires_access(client):
+    add_user('member')
+    db.session.add(Access(event='bov_2020', user='member'))
+    db.session.commit()
+    headers = credentials('member')
+    assert (
+        client.post('/events', data={'table': 'bov_2020'}, headers=headers).status_code
+        == 200
+    )
+    assert (
+        client.post('/events', data={'table': 'rsc_2019'}, headers=headers).status_code
+        == 401
+    )
+    assert client.get('/events/rows?table=rsc_2019', headers=headers).status_code == 401
+
+
+def test_events_page_hides_internal_tables(client):
+    headers = credentials('admin')
+    assert (
+        client.post('/events', data={'table': 'users'}, headers=headers).status_code
+        == 400
+    )
+    assert client.get('/events/rows?table=users', headers=headers).status_code == 400
@@ -0,0 +1,44 @@
+import os
+import time
+
+from hades import exports
+from hades.shared import connect
+
+from .conftest import credentials
+
+
+def add_job(job_id: str, status: str, pid: int = None, finished: float = None):
+    now = time.time()
+    connect(exports.JOBS_SCHEMA).execute(
+        'INSERT INTO exports (id, user, tables, status, pid, heartbeat, created, finished) '
+        "VALUES (?, 'admin', '[\"bov_2020\"]', ?, ?, ?, ?, ?)",
+        (job_id, status, pid, now, now, finished),
+    )
+
+
+def test_exports_are_limited(client, monkeypatch):
+    monkeypatch.setattr(exports, 'EXPORT_CONCURRENCY', 0)
+    response = client.post(
+        '/api/exports', data={'tables': 'bov_2020'}, headers=credentials('admin')
+    )
+    assert response.status_code == 503
+
+
+def test_dead_exports_are_failed(client):
+    # A pid beyond the default pid_max, which no process can have
+    add_job('dead', 'running', pid=2 ** 22 + 1)
+    exports.reap_jobs()
+    assert exports.get_job('dead')['status'] == 'failed'
+
+
+def test_old_exports_are_deleted(client):
+    finished = time.time() - exports.RETENTION_HOURS * 3600 - 60
+    add_job('old', 'done', finished=finished)
+    os.makedirs(exports.EXPORT_DIR, exist_ok=True)
+    path = exports.get_export_path('old')
+    open(path, 'wb').close()
+    os.utime(path, (finished, finished))
+
+    exports.reap_jobs()
+    assert exports.get_job('old')['status'] == 'expired'
+    assert not os.path.exists(path)
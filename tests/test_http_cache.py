@@ -0,0 +1,70 @@
+from hades import db
+from hades.models.group import Group
+from hades.models.group_access import GroupAccess
+from hades.models.membership import Membership
+
+from .conftest import add_user, credentials
+
+
+def setup_member():
+    """Adds a user with access to `bov_2020` through the `codex` group"""
+    add_user('member')
+    db.session.add(Group(name='codex', all_events=False))
+    db.session.add(Group(name='everything', all_events=True))
+    db.session.commit()
+    db.session.add(GroupAccess(group='codex', event='bov_2020'))
+    db.session.add(Membership(group='codex', user='member'))
+    db.session.commit()
+
+
+def test_membership_change_changes_etag(client):
+    setup_member()
+    headers = credentials('member')
+    response = client.get('/api/users?table=bov_2020', headers=headers)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    db.session.add(Membership(group='everything', user='member'))
+    db.session.commit()
+
+    response = client.get(
+        '/api/users?table=bov_2020', headers={**headers, 'If-None-Match': etag}
+    )
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_revoked_membership_is_not_served_from_cache(client):
+    setup_member()
+    headers = credentials('member')
+    etag = client.get('/api/users?table=bov_2020', headers=headers).headers['ETag']
+
+    db.session.delete(Membership.query.get(('codex', 'member')))
+    db.session.commit()
+
+    response = client.get(
+        '/api/users?table=bov_2020', headers={**headers, 'If-None-Match': etag}
+    )
+    assert response.status_code == 401
+
+
+def test_if_modified_since_is_not_trusted(client):
+    headers = credentials('admin')
+    response = client.get('/api/users?table=bov_2020', headers=headers)
+    last_modified = response.headers['Last-Modified']
+    client.post(
+        '/api/create',
+        data={
+            'table': 'bov_2020',
+            'name': 'User',
+            'email': 'user@test',
+            'phone': '9000000000',
+        },
+        headers=headers,
+    )
+    response = client.get(
+        '/api/users?table=bov_2020',
+        headers={**headers, 'If-Modified-Since': last_modified},
+    )
+    assert response.status_code == 200
+    assert len(response.get_json()) == 1
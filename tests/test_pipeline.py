@@ -0,0 +1,17 @@
+from hades.models.codex import CodexApril2019
+from hades.pipeline import SubmitPlan
+from hades.utils import DATABASE_CLASSES
+
+
+def test_plan_for_table_without_validation(client):
+    table = DATABASE_CLASSES['test_users']
+    plan = SubmitPlan(table, {'event': 'Test'}, '')
+    assert plan.validators == ()
+    user = plan.build_user({'name': 'Test', 'email': 'test@test', 'phone': '1'}, 1)
+    assert plan.validate(user) is True
+
+
+def test_plan_for_validated_table(client):
+    plan = SubmitPlan(CodexApril2019, {'event': 'Codex'}, '')
+    user = plan.build_user({'name': 'Test', 'email': 'test@test', 'phone': '1'}, 1)
+    assert 'too short' in plan.validate(user)
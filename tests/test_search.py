@@ -0,0 +1,57 @@
+import sqlite3
+
+import pytest
+
+from hades import search
+
+from .conftest import credentials
+
+
+def create(client, i: int):
+    client.post(
+        '/api/create',
+        data={
+            'table': 'bov_2020',
+            'name': f'Ada {i}',
+            'email': f'ada{i}@test',
+            'phone': str(9000000000 + i),
+        },
+        headers=credentials('admin'),
+    )
+
+
+def test_search_falls_back_to_tables_until_built(client):
+    search.connect_index().execute('DELETE FROM search_meta')
+    create(client, 1)
+    assert not search.is_index_built()
+    response = client.get('/api/search?q=Ada', headers=credentials('admin'))
+    assert response.status_code == 200
+    assert [user['email'] for user in response.json] == ['ada1@test']
+    assert not search.is_index_built()
+
+
+def test_failed_index_update_marks_index_stale(client, monkeypatch):
+    search.rebuild_index()
+    assert search.is_index_built()
+
+    def fail(changes):
+        raise sqlite3.OperationalError('database is locked')
+
+    monkeypatch.setattr(search, 'index_registrants', fail)
+    create(client, 2)
+    monkeypatch.undo()
+
+    assert not search.is_index_built()
+    response = client.get('/api/search?q=Ada', headers=credentials('admin'))
+    assert [user['email'] for user in response.json] == ['ada2@test']
+
+    search.rebuild_index()
+    assert search.is_index_built()
+
+
+@pytest.mark.parametrize('limit', ['0', '-1'])
+def test_search_rejects_limit_below_one(client, limit):
+    response = client.get(
+        f'/api/search?q=user&limit={limit}', headers=credentials('admin')
+    )
+    assert response.status_code == 400
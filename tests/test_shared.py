@@ -0,0 +1,20 @@
+import os
+import stat
+
+import pytest
+
+from hades.shared import make_private_dir
+
+
+def test_creates_private_dir(tmp_path):
+    path = str(tmp_path / 'state')
+    make_private_dir(path)
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o700
+
+
+def test_refuses_shared_dir(tmp_path):
+    path = tmp_path / 'state'
+    path.mkdir(mode=0o777)
+    os.chmod(path, 0o777)
+    with pytest.raises(RuntimeError):
+        make_private_dir(str(path))
@@ -0,0 +1,63 @@
+import queue
+
+from hades import stream
+from hades.shared import connect
+from hades.utils import get_registration_snapshot
+
+from .conftest import credentials
+
+
+def test_deltas_carry_the_version_of_the_snapshot(client):
+    for i in range(2):
+        client.post(
+            '/api/create',
+            data={
+                'table': 'bov_2020',
+                'name': f'User {i}',
+                'email': f'user{i}@test',
+                'phone': str(9000000000 + i),
+            },
+            headers=credentials('admin'),
+        )
+    count, version = get_registration_snapshot(['bov_2020'])['bov_2020']
+    assert count == 2
+    last = (
+        connect(stream.CHANNEL_SCHEMA, 'channel.db')
+        .execute(
+            "SELECT version FROM count_deltas WHERE event = 'bov_2020' ORDER BY seq DESC"
+        )
+        .fetchone()[0]
+    )
+    # The delta of the last registration is already counted in a snapshot taken after it
+    assert last == version
+
+
+def test_streams_are_capped_per_worker(client, monkeypatch):
+    monkeypatch.setattr(stream, 'STREAMS_PER_WORKER', 0)
+    response = client.get('/api/stats/stream', headers=credentials('admin'))
+    assert response.status_code == 503
+
+
+def test_stream_starts_with_snapshot(client):
+    response = client.get('/api/stats/stream', headers=credentials('admin'))
+    assert response.status_code == 200
+    first = next(response.response)
+    assert first.startswith(b'event: snapshot')
+    response.close()
+
+
+def test_stream_sends_deltas_out_of_order(client, monkeypatch):
+    _, version = get_registration_snapshot(['bov_2020'])['bov_2020']
+    subscriber = queue.Queue()
+    # Two commits after the snapshot reaching the channel in reverse order, and one counted in the snapshot already
+    for change in [
+        ('bov_2020', 1, version + 2),
+        ('bov_2020', 1, version + 1),
+        ('bov_2020', 1, version),
+        None,
+    ]:
+        subscriber.put(change)
+    monkeypatch.setattr(stream.broker, 'subscribe', lambda: subscriber)
+    response = client.get('/api/stats/stream', headers=credentials('admin'))
+    events = [chunk.split(b'\n')[0] for chunk in response.response]
+    assert events == [b'event: snapshot', b'event: delta', b'event: delta']
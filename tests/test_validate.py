@@ -0,0 +1,37 @@
+import pytest
+
+from hades import db
+from hades.models.codex import CodexApril2019
+from hades.utils import find_invalid_rows
+
+
+@pytest.mark.parametrize(
+    'phone, taken',
+    [
+        ('9876543210', True),
+        ('919876543210', True),
+        ('1234567890|9876543210', True),
+        ('9876543211', False),
+        ('98765%3210', False),
+    ],
+)
+def test_import_and_submit_agree_on_phone_numbers(client, phone, taken):
+    db.session.add(
+        CodexApril2019(name='Existing', email='existing@test', phone='919876543210')
+    )
+    db.session.commit()
+    user = CodexApril2019(name='New', email='new@test', phone=phone)
+    submitted = user.validate()
+    imported = find_invalid_rows(
+        CodexApril2019, [{'name': 'New', 'email': 'new@test', 'phone': phone}]
+    )
+    assert (submitted is not True) == taken
+    assert bool(imported) == taken
+
+
+def test_import_checks_phone_numbers_within_the_batch(client):
+    rows = [
+        {'name': 'First', 'email': 'first@test', 'phone': '919876543210'},
+        {'name': 'Second', 'email': 'second@test', 'phone': '9876543210'},
+    ]
+    assert list(find_invalid_rows(CodexApril2019, rows)) == [1]